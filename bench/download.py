@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2024 Nortxort
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+# Benchmark of the download_file write path.
+#
+# Usage: python -m bench.download [--size MB] [--repeat N] [--dir DIR]
+#
+# A local server in a separate process serves a file of --size MB,
+# which is downloaded with different chunk and buffer sizes. The CPU
+# time is of the downloading process only.
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from aiohttp import web as aioweb
+
+from web import download_file, Session
+
+HOST = '127.0.0.1'
+PORT = 8790
+
+# (name, chunk size, buffer size, preallocate)
+CONFIGS = [
+    ('4 KiB chunks, unbuffered', 4096, 0, False),
+    ('64 KiB chunks, 1 MiB buffer', 64 * 1024, 1024 * 1024, False),
+    ('64 KiB chunks, 1 MiB buffer, allocate', 64 * 1024, 1024 * 1024, True),
+    ('256 KiB chunks, 4 MiB buffer', 256 * 1024, 4 * 1024 * 1024, False),
+]
+
+
+def serve(size: int):
+    """ Serve a file of size bytes at /blob.zip. """
+    body = os.urandom(size)
+
+    async def blob(request):
+        return aioweb.Response(body=body, content_type='application/zip')
+
+    app = aioweb.Application()
+    app.router.add_get('/blob.zip', blob)
+    aioweb.run_app(app, host=HOST, port=PORT, print=None)
+
+
+async def wait_for_server():
+    for _ in range(100):
+        try:
+            _, writer = await asyncio.open_connection(HOST, PORT)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+
+
+async def run(size: int, repeat: int, path: Path):
+    await wait_for_server()
+
+    url = f'http://{HOST}:{PORT}/blob.zip'
+    target = path.joinpath('blob.zip')
+
+    for name, chunk_size, buffer_size, allocate in CONFIGS:
+        elapsed = cpu = 0
+
+        for _ in range(repeat):
+            start, start_cpu = time.perf_counter(), time.process_time()
+            _, downloaded, _, _, _, _ = await download_file(url, target, chunk_size=chunk_size,
+                                                            buffer_size=buffer_size,
+                                                            allocate=allocate)
+            elapsed += time.perf_counter() - start
+            cpu += time.process_time() - start_cpu
+
+            if downloaded != size:
+                print(f'{name}: downloaded {downloaded} of {size} bytes')
+            target.unlink()
+
+        gb = size * repeat / 1024 ** 3
+        print(f'{name:>40}: {size * repeat / elapsed / 1024 ** 2:8.1f} MB/s, '
+              f'{cpu / gb:6.2f} CPU s/GB')
+
+    await Session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the download_file write path.')
+    parser.add_argument('--size', type=int, default=256, help='size of the file in MB.')
+    parser.add_argument('--repeat', type=int, default=3, help='times to download the file.')
+    parser.add_argument('--dir', type=Path, help='directory to download to.')
+    args = parser.parse_args()
+
+    size = args.size * 1024 * 1024
+    server = multiprocessing.Process(target=serve, args=(size,), daemon=True)
+    server.start()
+
+    try:
+        if args.dir is None:
+            with tempfile.TemporaryDirectory() as tmp:
+                asyncio.run(run(size, args.repeat, Path(tmp)))
+        else:
+            asyncio.run(run(size, args.repeat, args.dir))
+    finally:
+        server.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2024 Nortxort
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+# Benchmark of the extraction backends.
+#
+# Usage: python -m bench.extractor [--pages DIR] [--repeat N]
+#
+# DIR should contain saved pages, the index page as index.html and
+# the sample pages as any other *.html file. Without DIR, synthetic
+# pages shaped like the MusicRadar pages are used.
+
+import argparse
+import time
+from pathlib import Path
+
+from extractor import BACKENDS, INDEX_ID, TEXT_COPY_CLASS
+
+
+def synthetic_pages(sample_pages: int = 20) -> tuple:
+    """
+    Create pages shaped like the MusicRadar index and sample pages.
+
+    :param sample_pages: the amount of sample pages.
+    :return: tuple of the index page and a list of sample pages.
+    """
+    head = ('<html><head><title>MusicRadar</title>'
+            '<script>var config = {"a": "<p>b</p>"};</script></head><body>'
+            + '<nav>' + '<a href="https://www.musicradar.com/nav">nav</a>' * 200 + '</nav>')
+    tail = ('<aside>' + '<p><a href="https://www.musicradar.com/related">related</a></p>' * 300
+            + '</aside></body></html>')
+
+    paragraphs = ''.join(f'<p>intro {i}</p>' for i in range(9))
+    paragraphs += ''.join(f'<p><strong><a href="https://www.musicradar.com/news/samples-{i}">'
+                          f'Sample page {i}</a></strong> - free samples</p>' for i in range(300))
+    index = f'{head}<div id="{INDEX_ID}">{paragraphs}<p>end</p></div>{tail}'
+
+    pages = []
+    for i in range(sample_pages):
+        paragraphs = ''.join(f'<p>Download <a href="https://cdn.mos.musicradar.com/audio/samples/'
+                             f'pack-{i}-{j}.zip">Pack {i} &amp; {j}</a><br>{"text " * 40}</p>'
+                             for j in range(4))
+        pages.append(f'{head}<div class="{TEXT_COPY_CLASS}">{paragraphs}</div>{tail}')
+
+    return index, pages
+
+
+def load_pages(path: Path) -> tuple:
+    index = path.joinpath('index.html').read_text(encoding='utf-8')
+    pages = [p.read_text(encoding='utf-8') for p in sorted(path.glob('*.html'))
+             if p.name != 'index.html']
+
+    return index, pages
+
+
+def run(index: str, pages: list, repeat: int):
+    results = {}
+    size = (len(index) + sum(len(p) for p in pages)) * repeat
+
+    for name, (sample_page_urls, sample_packs) in BACKENDS.items():
+        start = time.perf_counter()
+        for _ in range(repeat):
+            output = (sample_page_urls(index), [sample_packs(p) for p in pages])
+        elapsed = time.perf_counter() - start
+
+        results[name] = output
+        print(f'{name:>8}: {elapsed:8.3f}s, {(len(pages) + 1) * repeat / elapsed:8.1f} pages/s, '
+              f'{size / elapsed / 1024 / 1024:6.1f} MB/s')
+
+    reference = results.pop('bs4')
+    for name, output in results.items():
+        print(f'{name:>8}: output {"identical to" if output == reference else "DIFFERS from"} bs4')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the extraction backends.')
+    parser.add_argument('--pages', type=Path, help='directory with saved pages.')
+    parser.add_argument('--repeat', type=int, default=5, help='times to parse every page.')
+    args = parser.parse_args()
+
+    if args.pages is None:
+        index, pages = synthetic_pages()
+    else:
+        index, pages = load_pages(args.pages)
+
+    run(index, pages, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2024 Nortxort
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+# A local stand-in for the MusicRadar site and CDN.
+#
+# Usage: python -m bench.fake_server [--pages DIR] [--port PORT] [options]
+#
+# Serves the index page, the sample pages and synthetic zip files.
+# DIR should contain recorded pages, like for bench.extractor. Without
+# DIR, synthetic pages are served. The links in the pages are rewritten
+# to the local server. Latency, throttling, connection resets and server
+# errors can be injected, see --help.
+
+import argparse
+import asyncio
+import io
+import os
+import random
+import re
+import zipfile
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from aiohttp import web as aioweb
+
+from bench.extractor import synthetic_pages, load_pages
+from extractor import stream_sample_page_urls
+from musicradar import MusicRadarParser
+
+HOST = '127.0.0.1'
+PORT = 8791
+
+SITE_URL = MusicRadarParser._BASE_URL
+CDN_URL = 'https://cdn.mos.musicradar.com/'
+
+
+class FakeServer:
+    """
+    The MusicRadar pages and zip files, with injected faults.
+    """
+    def __init__(self, index: str, pages: list, zip_sizes: tuple = (1024 * 1024,),
+                 latency: float = 0, throttle: float = 0, errors: float = 0,
+                 resets: float = 0, rate: int = 0, seed: int = 0,
+                 host: str = HOST, port: int = PORT):
+        """
+        Initialize the FakeServer class.
+
+        :param index: html of the index page.
+        :param pages: list of html of the sample pages.
+        :param zip_sizes: sizes in bytes of the zip files, used in turns.
+        :param latency: seconds added to every response.
+        :param throttle: fraction of requests answered with 429.
+        :param errors: fraction of requests answered with 503.
+        :param resets: fraction of zip downloads cut off halfway.
+        :param rate: max bytes per second of a zip download, 0 for no limit.
+        :param seed: seed of the fault injection, so runs are reproducible.
+        :param host: host to serve on.
+        :param port: port to serve on.
+        """
+        self.base_url = f'http://{host}:{port}/'
+        self.host = host
+        self.port = port
+        self._latency = latency
+        self._throttle = throttle
+        self._errors = errors
+        self._resets = resets
+        self._rate = rate
+        self._random = random.Random(seed)
+        self._zip_sizes = zip_sizes
+        self._zips = {}
+
+        index_path = urlsplit(MusicRadarParser._INDEX_URL).path
+        self._pages = {index_path: self._rewrite(index)}
+
+        urls = [url for url in stream_sample_page_urls(index) if url.startswith(SITE_URL)]
+        for num, url in enumerate(urls):
+            html = self._rewrite(pages[num % len(pages)])
+            if num >= len(pages):
+                # a page is used again, give its zip files other names
+                html = re.sub(r'([\w.-]+)\.zip', rf'\1-{num}.zip', html)
+            self._pages[urlsplit(url).path] = html
+
+    @property
+    def index_url(self) -> str:
+        """ url of the index page on the local server. """
+        return self._rewrite(MusicRadarParser._INDEX_URL)
+
+    def _rewrite(self, html: str) -> str:
+        return html.replace(SITE_URL, self.base_url).replace(CDN_URL, self.base_url)
+
+    def zip_file(self, path: str) -> bytes:
+        """
+        A zip file with one stored member of random data.
+
+        The size of the zip file is picked from zip_sizes by path,
+        so a path always gets the same zip file.
+        """
+        size = self._zip_sizes[sum(path.encode()) % len(self._zip_sizes)]
+        if size not in self._zips:
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as z:
+                z.writestr('sample.wav', os.urandom(max(0, size - 200)))
+            self._zips[size] = buffer.getvalue()
+
+        return self._zips[size]
+
+    def app(self) -> aioweb.Application:
+        app = aioweb.Application()
+        app.router.add_route('*', '/{path:.*}', self._handle)
+        return app
+
+    async def _handle(self, request):
+        if self._latency > 0:
+            await asyncio.sleep(self._latency)
+
+        if self._random.random() < self._throttle:
+            return aioweb.Response(status=429, headers={'Retry-After': '1'})
+
+        if self._random.random() < self._errors:
+            return aioweb.Response(status=503)
+
+        if request.path in self._pages:
+            return aioweb.Response(text=self._pages[request.path], content_type='text/html')
+
+        if request.path.endswith('.zip'):
+            return await self._zip_response(request)
+
+        return aioweb.Response(status=404)
+
+    async def _zip_response(self, request):
+        body = self.zip_file(request.path)
+        start, end = 0, len(body) - 1
+        status = 200
+        headers = {'Accept-Ranges': 'bytes', 'ETag': f'"{len(body)}"',
+                   'Content-Type': 'application/zip'}
+
+        range_header = request.headers.get('Range', '')
+        if range_header.startswith('bytes='):
+            first, _, last = range_header[6:].partition('-')
+            start = int(first)
+            end = min(int(last), end) if last else end
+            if start > end:
+                return aioweb.Response(status=416, headers={'Content-Range': f'bytes */{len(body)}'})
+            status = 206
+            headers['Content-Range'] = f'bytes {start}-{end}/{len(body)}'
+
+        headers['Content-Length'] = str(end - start + 1)
+        response = aioweb.StreamResponse(status=status, headers=headers)
+        await response.prepare(request)
+
+        if request.method == 'HEAD':
+            return response
+
+        reset = self._random.random() < self._resets
+        view = memoryview(body)[start:end + 1]
+        chunk = 256 * 1024 if self._rate <= 0 else max(1, self._rate // 10)
+
+        for offset in range(0, len(view), chunk):
+            if reset and offset >= len(view) // 2:
+                # cut the connection halfway
+                request.transport.close()
+                return response
+
+            await response.write(view[offset:offset + chunk])
+            if self._rate > 0:
+                await asyncio.sleep(chunk / self._rate)
+
+        await response.write_eof()
+        return response
+
+    def run(self):
+        """ Serve until the process is stopped. """
+        aioweb.run_app(self.app(), host=self.host, port=self.port, print=None)
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """ Add the arguments of the fake server to an argument parser. """
+    parser.add_argument('--pages', type=Path, help='directory with recorded pages.')
+    parser.add_argument('--sample-pages', type=int, default=20,
+                        help='amount of synthetic sample pages.')
+    parser.add_argument('--zip-sizes', default='1', help='comma separated zip sizes in MB.')
+    parser.add_argument('--latency', type=float, default=0, help='seconds added to every response.')
+    parser.add_argument('--throttle', type=float, default=0, help='fraction of 429 responses.')
+    parser.add_argument('--errors', type=float, default=0, help='fraction of 503 responses.')
+    parser.add_argument('--resets', type=float, default=0, help='fraction of zip downloads cut off.')
+    parser.add_argument('--rate', type=float, default=0, help='max MB/s of a zip download.')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the fault injection.')
+    parser.add_argument('--port', type=int, default=PORT, help='port to serve on.')
+
+
+def from_arguments(args) -> FakeServer:
+    """ Create a FakeServer from parsed arguments. """
+    if args.pages is None:
+        index, pages = synthetic_pages(args.sample_pages)
+    else:
+        index, pages = load_pages(args.pages)
+
+    return FakeServer(index, pages,
+                      zip_sizes=tuple(int(float(mb) * 1024 * 1024) for mb in args.zip_sizes.split(',')),
+                      latency=args.latency, throttle=args.throttle, errors=args.errors,
+                      resets=args.resets, rate=int(args.rate * 1024 * 1024), seed=args.seed,
+                      port=args.port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a local stand-in for MusicRadar.')
+    add_arguments(parser)
+    server = from_arguments(parser.parse_args())
+
+    print(f'serving {server.index_url}')
+    server.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2024 Nortxort
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+# End to end benchmark of the parser and downloader, against a local
+# stand-in for MusicRadar(see bench.fake_server).
+#
+# Usage: python -m bench.replay [--pages-num N] [--parser-workers N,..]
+#        [--download-workers N,..] [--chunk-sizes KB,..] [--backends NAME,..]
+#        [--download-processes N,..] [--processes N] [fake server options]
+#
+# Every combination of the comma separated options is run, and reports
+# pages/s, MB/s, CPU time(including the parser and download processes)
+# and peak RSS.
+# The server runs in a separate process, so it is not in the CPU time.
+# Peak RSS is the peak of the benchmark process so far, and is not
+# available on windows.
+
+import argparse
+import asyncio
+import itertools
+import multiprocessing
+import tempfile
+import time
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from bench.fake_server import add_arguments, from_arguments
+from web import Session, PAGE_PROFILE, DOWNLOAD_PROFILE
+from musicradar import MusicRadarParser
+from downloader import Downloader
+from process_downloader import ProcessDownloader
+from retry import RetryScheduler
+from metrics import Metrics
+
+
+def serve(args):
+    from_arguments(args).run()
+
+
+def cpu_time() -> float:
+    """ CPU time of this process and its finished child processes. """
+    if resource is None:
+        return time.process_time()
+
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def peak_rss() -> float:
+    """ Peak RSS in MB of this process, or 0 if unknown. """
+    if resource is None:
+        return 0
+    # kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def wait_for_server(host: str, port: int):
+    for _ in range(100):
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+
+
+async def run_once(args, base_url: str, path: Path, backend: str,
+                   parser_workers: int, download_workers: int, chunk_size: int,
+                   download_processes: int):
+
+    class ReplayParser(MusicRadarParser):
+        _BASE_URL = base_url
+        _INDEX_URL = MusicRadarParser._INDEX_URL.replace(MusicRadarParser._BASE_URL, base_url)
+
+    Session.create_pool(MusicRadarParser.POOL, PAGE_PROFILE, limit_per_host=parser_workers)
+    Session.create_pool(Downloader.POOL, DOWNLOAD_PROFILE, limit_per_host=download_workers)
+
+    retry = RetryScheduler(base_delay=args.retry_delay)
+    metrics = Metrics(retry)
+    packs = []
+
+    async def on_sample_pack(sp):
+        packs.append(sp)
+
+    parser = ReplayParser(pages_num=args.pages_num, on_sample_pack=on_sample_pack,
+                          backend=backend, processes=args.processes,
+                          retry=retry, metrics=metrics.parser)
+    if download_processes > 0:
+        downloader = ProcessDownloader(path, download_processes, args.queue_size, retry=retry,
+                                       metrics=metrics.download, chunk_size=chunk_size)
+    else:
+        downloader = Downloader(path, (), args.queue_size, resume=True, retry=retry,
+                                metrics=metrics.download, chunk_size=chunk_size)
+
+    start, start_cpu = time.perf_counter(), cpu_time()
+    await parser.start(parser_workers)
+    parse_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    downloader.start_workers(download_workers)
+    for sp in packs:
+        await downloader.put(sp)
+    await downloader.stop()
+    download_time = time.perf_counter() - start
+    cpu = cpu_time() - start_cpu
+
+    await Session.close()
+
+    pages = metrics.parser.done
+    mb = metrics.download.bytes / 1024 / 1024
+    print(f'{backend:>6} {parser_workers:>3} {download_workers:>3} {download_processes:>3} '
+          f'{chunk_size // 1024:>5}K: '
+          f'{pages / parse_time:8.1f} pages/s, {downloader.downloaded:>4} packs, '
+          f'{mb / download_time:7.1f} MB/s, {cpu:6.2f} CPU s, {peak_rss():6.1f} MB peak RSS, '
+          f'{retry.retries} retries, {len(retry.dead_letters)} failed')
+
+
+async def run(args, base_url: str):
+    await wait_for_server('127.0.0.1', args.port)
+
+    print('backend  pw  dw  dp  chunk')
+    for backend, parser_workers, download_workers, download_processes, chunk_kb in itertools.product(
+            args.backends.split(','),
+            [int(n) for n in args.parser_workers.split(',')],
+            [int(n) for n in args.download_workers.split(',')],
+            [int(n) for n in args.download_processes.split(',')],
+            [int(n) for n in args.chunk_sizes.split(',')]):
+
+        with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+            await run_once(args, base_url, Path(tmp), backend, parser_workers,
+                           download_workers, chunk_kb * 1024, download_processes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the parser and downloader end to end.')
+    add_arguments(parser)
+    parser.add_argument('--pages-num', type=int, default=10, help='sample pages to parse, 0 for all.')
+    parser.add_argument('--parser-workers', default='3', help='comma separated parser workers.')
+    parser.add_argument('--download-workers', default='5', help='comma separated download workers.')
+    parser.add_argument('--download-processes', default='0',
+                        help='comma separated download processes, 0 downloads in the main process.')
+    parser.add_argument('--chunk-sizes', default='64', help='comma separated chunk sizes in KB.')
+    parser.add_argument('--backends', default='stream', help='comma separated parser backends.')
+    parser.add_argument('--processes', type=int, default=0, help='parser processes.')
+    parser.add_argument('--queue-size', type=int, default=150, help='max size of the download queue.')
+    parser.add_argument('--retry-delay', type=float, default=0.1, help='seconds before the first retry.')
+    parser.add_argument('--dir', type=Path, help='directory to download to.')
+    args = parser.parse_args()
+
+    server = multiprocessing.Process(target=serve, args=(args,), daemon=True)
+    server.start()
+
+    try:
+        asyncio.run(run(args, f'http://127.0.0.1:{args.port}/'))
+    finally:
+        server.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2024 Nortxort
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+# Benchmark of SamplePack objects.
+#
+# Usage: python -m bench.samplepack [--packs N] [--repeat N]
+#
+# Creates N synthetic sample packs, and times the attribute access
+# of the skip check and reports, and the tuple, JSON and pickle
+# round trips used for caching and sending packs to other processes.
+
+import argparse
+import json
+import pickle
+import time
+import tracemalloc
+
+from samplepack import SamplePack
+
+
+def synthetic_packs(packs: int) -> list:
+    """
+    Create sample packs shaped like the MusicRadar sample packs.
+
+    :param packs: the amount of sample packs.
+    :return: list of SamplePack objects.
+    """
+    return [SamplePack(f'https://www.musicradar.com/news/samples-{i // 4}',
+                       f'https://cdn.mos.musicradar.com/audio/samples/pack-{i}.zip',
+                       f'Sample pack {i}')
+            for i in range(packs)]
+
+
+def timed(name: str, func, packs: int, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    elapsed = time.perf_counter() - start
+
+    print(f'{name:>12}: {elapsed / repeat * 1000:8.1f}ms, '
+          f'{packs * repeat / elapsed / 1000:8.1f}k packs/s')
+
+    return result
+
+
+def run(packs: int, repeat: int):
+    tracemalloc.start()
+    sample_packs = synthetic_packs(packs)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f'{packs} packs, {size / packs:.0f} bytes per pack')
+
+    names = {sp.key for sp in sample_packs[::2]}
+
+    timed('create', lambda: synthetic_packs(packs), packs, repeat)
+    timed('file_name', lambda: [sp.file_name for sp in sample_packs], packs, repeat)
+    timed('key lookup', lambda: sum(sp.key in names for sp in sample_packs), packs, repeat)
+
+    tuples = timed('to_tuple', lambda: [sp.to_tuple() for sp in sample_packs], packs, repeat)
+    timed('from_tuple', lambda: [SamplePack.from_tuple(t) for t in tuples], packs, repeat)
+
+    data = timed('json dump', lambda: json.dumps(tuples), packs, repeat)
+    loaded = timed('json load', lambda: [SamplePack.from_tuple(t) for t in json.loads(data)],
+                   packs, repeat)
+
+    data = timed('pickle dump', lambda: pickle.dumps(sample_packs, pickle.HIGHEST_PROTOCOL),
+                 packs, repeat)
+    timed('pickle load', lambda: pickle.loads(data), packs, repeat)
+
+    same = all(a.to_tuple() == b.to_tuple() for a, b in zip(sample_packs, loaded))
+    print(f'round trip: {"identical" if same else "DIFFERS"}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark SamplePack objects.')
+    parser.add_argument('--packs', type=int, default=100_000, help='amount of sample packs.')
+    parser.add_argument('--repeat', type=int, default=5, help='times to run every benchmark.')
+    args = parser.parse_args()
+
+    run(args.packs, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
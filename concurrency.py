@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2024 Nortxort
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+
+log = logging.getLogger(__name__)
+
+
+def spawn_executor(workers: int) -> ProcessPoolExecutor:
+    """
+    Create a process pool, with processes started by spawning.
+
+    The default on linux is to fork, which copies the running event
+    loop and open connections into the process, and is not safe.
+    Functions run in the pool must be importable by the processes.
+
+    :param workers: the amount of processes.
+    :return: ProcessPoolExecutor object.
+    """
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD(additive increase, multiplicative decrease) worker limit.
+
+    Workers record the outcome of each request. Every interval the limit is
+    adjusted: errors(timeouts, 429, 5xx) or inflated latency halve the limit,
+    otherwise the limit grows by one, as long as it raises the throughput.
+    """
+    def __init__(self, initial: int, minimum: int = 1, maximum: int = 16,
+                 interval: float = 5.0, backoff: float = 0.5,
+                 max_error_rate: float = 0.05, latency_factor: float = 2.0,
+                 min_gain: float = 0.05):
+        """
+        Initialize the AdaptiveConcurrency class.
+
+        :param initial: the initial limit.
+        :param minimum: the lowest limit.
+        :param maximum: the highest limit.
+        :param interval: seconds between adjustments.
+        :param backoff: factor the limit is multiplied with on congestion.
+        :param max_error_rate: error rate of a window seen as congestion.
+        :param latency_factor: latency above the lowest latency times
+        this factor is seen as congestion.
+        :param min_gain: throughput gain needed to keep an increase.
+        """
+        self._limit = min(max(initial, minimum), maximum)
+        self._minimum = minimum
+        self._maximum = maximum
+        self.interval = interval
+        self._backoff = backoff
+        self._max_error_rate = max_error_rate
+        self._latency_factor = latency_factor
+        self._min_gain = min_gain
+
+        self._base_latency = None
+        self._last_rate = None
+        self._increased = False
+        self._reset_window()
+
+    @property
+    def limit(self) -> int:
+        """ the current worker limit. """
+        return self._limit
+
+    @property
+    def maximum(self) -> int:
+        """ the highest worker limit. """
+        return self._maximum
+
+    def _reset_window(self):
+        self._started = time.monotonic()
+        self._requests = 0
+        self._errors = 0
+        self._latency = 0.0
+        self._timed = 0
+        self._bytes = 0
+
+    def record(self, latency: float = None, nbytes: int = 0, error: bool = False):
+        """
+        Record the outcome of a request.
+
+        :param latency: seconds the request took, or None to not
+        use the request for latency.
+        :param nbytes: bytes transferred.
+        :param error: True if the request failed, timed out,
+        or was answered with 429 or 5xx.
+        """
+        self._requests += 1
+        self._bytes += nbytes
+        if error:
+            self._errors += 1
+        elif latency is not None:
+            self._latency += latency
+            self._timed += 1
+
+    def add_bytes(self, nbytes: int):
+        """
+        Record bytes transferred, while a request is still running.
+
+        Long requests, e.g large downloads, then count in the windows
+        the bytes arrived in, instead of all at once when they finish.
+
+        :param nbytes: bytes transferred.
+        """
+        self._bytes += nbytes
+
+    def adjust(self) -> int:
+        """
+        Adjust the limit to the requests recorded since the last adjustment.
+
+        :return: the new limit.
+        """
+        elapsed = time.monotonic() - self._started
+        if (self._requests == 0 and self._bytes == 0) or elapsed <= 0:
+            return self._limit
+
+        rate = (self._bytes or self._requests) / elapsed
+        error_rate = self._errors / self._requests if self._requests > 0 else 0.0
+
+        congested = error_rate > self._max_error_rate
+        if self._timed > 0:
+            latency = self._latency / self._timed
+            if self._base_latency is None or latency < self._base_latency:
+                self._base_latency = latency
+            elif latency > self._base_latency * self._latency_factor:
+                congested = True
+
+        old = self._limit
+        if congested:
+            self._limit = max(self._minimum, int(self._limit * self._backoff))
+            self._increased = False
+        elif self._increased and rate < self._last_rate * (1 + self._min_gain):
+            # the last increase did not pay off
+            self._limit = max(self._minimum, self._limit - 1)
+            self._increased = False
+        elif self._limit < self._maximum:
+            self._limit += 1
+            self._increased = True
+
+        if self._limit != old:
+            log.debug(f'limit {old} -> {self._limit}, rate: {rate:.1f}/s, '
+                      f'error rate: {error_rate:.2f}')
+
+        self._last_rate = rate
+        self._reset_window()
+        return self._limit
+
+
+class WorkerPool:
+    """
+    Keeps a number of queue worker tasks running.
+
+    Without a controller the number is fixed. With an AdaptiveConcurrency
+    controller, workers are added when the limit grows, and workers above
+    the limit stop, once they are done with their current item.
+    """
+    def __init__(self, worker, workers: int, controller: AdaptiveConcurrency = None):
+        """
+        Initialize the WorkerPool class.
+
+        :param worker: coroutine function taking the worker number.
+        The worker should loop while `is_active(num)` is True.
+        :param workers: the amount of workers without a controller.
+        :param controller: AdaptiveConcurrency object or None.
+        """
+        self._worker = worker
+        self._workers = workers
+        self._controller = controller
+        self._tasks = {}
+        self._monitor = None
+
+    @property
+    def limit(self) -> int:
+        """ the amount of workers that should be running. """
+        if self._controller is None:
+            return self._workers
+        return self._controller.limit
+
+    def is_active(self, num: int) -> bool:
+        """
+        Check if a worker should take another item.
+
+        :param num: the worker number.
+        """
+        return num < self.limit
+
+    def start(self):
+        """ Start the workers, and the controller. """
+        self._spawn()
+        if self._controller is not None:
+            self._monitor = asyncio.create_task(self._adjust())
+
+    def cancel(self):
+        """ Cancel the workers, and the controller. """
+        if self._monitor is not None:
+            self._monitor.cancel()
+            self._monitor = None
+
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks = {}
+
+    def _spawn(self):
+        for num in range(self.limit):
+            task = self._tasks.get(num)
+            if task is None or task.done():
+                task = asyncio.create_task(self._worker(num))
+                task.add_done_callback(self._on_done)
+                self._tasks[num] = task
+
+    def _on_done(self, task: asyncio.Task):
+        if task.cancelled() or task.exception() is None:
+            return
+
+        # a worker should handle its own errors, keep the pool running anyway
+        log.error('worker stopped by an exception, starting a new one',
+                  exc_info=task.exception())
+        if task in self._tasks.values():
+            self._spawn()
+
+    async def _adjust(self):
+        while True:
+            await asyncio.sleep(self._controller.interval)
+            self._controller.adjust()
+            self._spawn()
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2024 Nortxort
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import argparse
+import inspect
+import json
+import re
+
+
+# a setting is an upper case module constant of one of these types
+SETTING_TYPES = (bool, int, float, str)
+
+_CONSTANT = re.compile(r'^([A-Z][A-Z0-9_]*) = ')
+
+
+class ConfigError(Exception):
+    """ Raised on an unknown setting, or a value of the wrong type. """
+
+
+def _scan(module) -> dict:
+    """
+    The upper case names assigned at the top of a module, with the
+    comment lines above them.
+    """
+    try:
+        lines = inspect.getsource(module).splitlines()
+    except (OSError, TypeError):
+        return {}
+
+    result = {}
+    comment = []
+    for line in lines:
+        if line.startswith('#'):
+            comment.append(line.lstrip('# ').strip())
+            continue
+
+        match = _CONSTANT.match(line)
+        if match:
+            result[match.group(1)] = ' '.join(comment)
+        comment = []
+
+    return result
+
+
+def settings(module) -> dict:
+    """
+    The settings of a module, the upper case constants
+    of a simple type assigned in the module.
+
+    :param module: the module.
+    :return: dictionary of the setting names and values.
+    """
+    values = vars(module)
+    return {name: values[name] for name in _scan(module)
+            if type(values.get(name)) in SETTING_TYPES}
+
+
+def descriptions(module) -> dict:
+    """
+    The descriptions of the settings of a module,
+    from the comment lines above each setting.
+
+    :param module: the module.
+    :return: dictionary of the setting names and descriptions.
+    """
+    return {name: comment for name, comment in _scan(module).items() if comment}
+
+
+def value(name: str, default, new):
+    """
+    Check the value of a setting against the type of its default.
+
+    :param name: name of the setting.
+    :param default: the default value.
+    :param new: the new value.
+    :return: the new value, an int is accepted for a float.
+    """
+    if type(default) is float and type(new) is int:
+        return float(new)
+
+    if type(new) is not type(default):
+        raise ConfigError(f'{name.lower()} should be {type(default).__name__}, '
+                          f'not {type(new).__name__}')
+
+    return new
+
+
+def load(path: str, defaults: dict) -> dict:
+    """
+    Load settings from a json config file.
+
+    The keys are the setting names in lower case, e.g `download_workers`.
+
+    :param path: path to the config file.
+    :param defaults: the settings and their default values.
+    :return: dictionary of the setting names and values in the file.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ConfigError(f'failed to load config {path}: {e}') from e
+
+    if not isinstance(data, dict):
+        raise ConfigError(f'config {path} should contain a json object')
+
+    result = {}
+    for key, new in data.items():
+        name = key.upper()
+        if name not in defaults:
+            raise ConfigError(f'unknown setting {key} in {path}')
+        result[name] = value(name, defaults[name], new)
+
+    return result
+
+
+def add_arguments(parser: argparse.ArgumentParser, defaults: dict,
+                  help_texts: dict = None, aliases: dict = None):
+    """
+    Add an option for every setting to an argument parser.
+
+    The options are the setting names in lower case with dashes,
+    e.g `--download-workers`. Bool settings get a `--no-` option too.
+    Options that are not given are not in the parsed arguments.
+
+    :param parser: the argument parser.
+    :param defaults: the settings and their default values.
+    :param help_texts: descriptions of the settings.
+    :param aliases: extra option strings of settings.
+    """
+    help_texts = help_texts or {}
+    aliases = aliases or {}
+
+    for name, default in defaults.items():
+        flags = [f'--{name.lower().replace("_", "-")}'] + aliases.get(name, [])
+        kwargs = {
+            'dest': name,
+            'default': argparse.SUPPRESS,
+            'help': f'{help_texts.get(name, "")} (default: {default!r})'.lstrip()
+        }
+
+        if type(default) is bool:
+            kwargs['action'] = argparse.BooleanOptionalAction
+        else:
+            kwargs['type'] = type(default)
+            kwargs['metavar'] = type(default).__name__.upper()
+
+        parser.add_argument(*flags, **kwargs)
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2024 Nortxort
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import json
+import logging
+import time
+from pathlib import Path
+
+from file_handler import write_json
+from samplepack import SamplePack
+
+
+log = logging.getLogger(__name__)
+
+
+class CrawlState:
+    """
+    Record of parsed sample pages, and the sample packs found on them.
+
+    The record is stored as a json file in the root directory,
+    and used to skip sample pages already parsed on earlier runs.
+    """
+    FILE_NAME = '.sample-rip-pages.json'
+
+    def __init__(self, path: str, max_age: int = 0):
+        """
+        Initialize the CrawlState class.
+
+        :param path: path to the root directory.
+        :param max_age: seconds before a parsed page is parsed again.
+        0 to never parse a page again.
+        """
+        self._path = Path(path).joinpath(self.FILE_NAME)
+        self._max_age = max_age
+        self._pages = {}
+
+    @property
+    def path(self) -> Path:
+        """ path to the crawl state file. """
+        return self._path
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+    def load(self) -> int:
+        """
+        Load the crawl state file.
+
+        :return: the amount of parsed pages.
+        """
+        if self._path.is_file():
+            try:
+                with open(self._path, 'r', encoding='utf-8') as f:
+                    self._pages = json.load(f).get('pages', {})
+            except (OSError, ValueError) as e:
+                log.error(f'failed to load crawl state {self._path}: {e}')
+
+        log.debug(f'loaded {len(self._pages)} parsed pages')
+        return len(self._pages)
+
+    def save(self):
+        """ Save the crawl state file. """
+        write_json(self._path, {'version': 1, 'pages': self._pages})
+
+    def is_fresh(self, page_url: str) -> bool:
+        """
+        Check if a page was parsed, and does not need parsing again.
+
+        :param page_url: url of the sample page.
+        :return: True if the page was parsed within max age, else False.
+        """
+        page = self._pages.get(page_url)
+        if page is None:
+            return False
+
+        if self._max_age > 0:
+            return time.time() - page['parsed'] < self._max_age
+
+        return True
+
+    def sample_packs(self, page_url: str) -> list:
+        """
+        Sample packs found on a parsed page.
+
+        :param page_url: url of the sample page.
+        :return: list of SamplePack objects.
+        """
+        page = self._pages.get(page_url)
+        if page is None:
+            return []
+
+        return [SamplePack(page_url, url, title) for url, title in page['packs']]
+
+    def update(self, page_url: str, sample_packs: list):
+        """
+        Record the sample packs found on a page.
+
+        :param page_url: url of the sample page.
+        :param sample_packs: list of SamplePack objects found on the page.
+        """
+        self._pages[page_url] = {
+            'parsed': int(time.time()),
+            'packs': [[sp.url, sp.title] for sp in sample_packs]
+        }
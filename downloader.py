@@ -24,71 +24,457 @@ FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 DEALINGS IN THE SOFTWARE.
 """
 
+import os
+import json
 import logging
 import asyncio
+import hashlib
+import threading
+import time
+from collections import deque
+from functools import partial
+from pathlib import Path
+from urllib.parse import urlsplit
 
-from web import download_file, agent
+from web import download_file, download_range, head, preallocate, agent, \
+     ERROR_CONNECTION, ERROR_TIMEOUT, ERROR_THROTTLED, ERROR_SERVER, ERROR_INCOMPLETE
+from manifest import file_checksum, verify_file
+from file_handler import write_json
+from concurrency import WorkerPool
+from retry import RetryScheduler
+from scheduler import PackQueue, FIFO
 
 log = logging.getLogger(__name__)
 
+# errors that mean the server is overloaded
+CONGESTION_ERRORS = (ERROR_CONNECTION, ERROR_TIMEOUT, ERROR_THROTTLED, ERROR_SERVER)
+
+
+class _Segments:
+    """
+    The byte ranges of a file downloaded in segments.
+
+    The ranges are written to a preallocated `.segments` file. The ranges,
+    and which of them are finished, are saved to a json file next to it.
+    """
+    def __init__(self, path: Path):
+        """
+        Initialize the _Segments class.
+
+        :param path: path to the `.segments` file.
+        """
+        self.path = path
+        self.ranges = []
+        self._state_path = path.with_name(f'{path.name}.json')
+        self._done = set()
+        self._size = 0
+        self._validator = ''
+        # the helpers of a download finish ranges at the same time
+        self._lock = threading.Lock()
+
+    def load(self, size: int, validator: str) -> bool:
+        """
+        Load the finished ranges of an earlier download of the file.
+
+        :param size: the size of the file.
+        :param validator: the ETag or Last-Modified header of the file.
+        :return: True if the earlier download can be continued, else False.
+        """
+        try:
+            with open(self._state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            unchanged = (state['size'] == size and state['validator'] == validator
+                         and self.path.stat().st_size == size)
+        except (OSError, ValueError, KeyError) as e:
+            log.debug(f'not continuing {self.path}: {e}')
+            return False
+
+        if not unchanged:
+            log.info(f'{self.path} changed on the server, downloading it again')
+            return False
+
+        self.ranges = [tuple(r) for r in state['ranges']]
+        self._done = {tuple(r) for r in state['done']}
+        self._size, self._validator = size, validator
+        return True
+
+    def create(self, size: int, segments: int, validator: str):
+        """
+        Split a file in ranges, and preallocate the `.segments` file.
+
+        :param size: the size of the file.
+        :param segments: the amount of ranges.
+        :param validator: the ETag or Last-Modified header of the file.
+        """
+        step = -(-size // segments)
+        self.ranges = [(start, min(start + step, size) - 1) for start in range(0, size, step)]
+        self._done = set()
+        self._size, self._validator = size, validator
+
+        # not a `.part` file, a preallocated file can not be resumed as one
+        with open(self.path, 'wb') as f:
+            preallocate(f.fileno(), size)
+        self._save()
+
+    def missing(self) -> list:
+        """ The ranges that are not finished. """
+        return [r for r in self.ranges if r not in self._done]
+
+    def finish(self, start: int, end: int):
+        """
+        Record a finished range, once its data is on disk.
+
+        :param start: first byte of the range.
+        :param end: last byte of the range.
+        """
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+        with self._lock:
+            self._done.add((start, end))
+            self._save()
+
+    def replace(self, path: Path):
+        """
+        Move the finished file to path.
+
+        :param path: path of the downloaded file.
+        """
+        self.path.replace(path)
+        self._state_path.unlink(missing_ok=True)
+
+    def _save(self):
+        write_json(self._state_path, {'size': self._size, 'validator': self._validator,
+                                      'ranges': self.ranges, 'done': sorted(self._done)})
+
 
 class Downloader:
-    def __init__(self, path, sample_packs: list, queue_size: int = 10):
+    # name of the Session pool for downloads
+    POOL = 'downloads'
+
+    def __init__(self, path, sample_packs=(), queue_size: int = 10,
+                 resume: bool = True, retry=None,
+                 segment_threshold: int = 0, segments: int = 4,
+                 host_segments: int = 4, manifest=None, controller=None,
+                 on_download=None, limiter=None, policy: str = FIFO, metrics=None,
+                 chunk_size: int = 64 * 1024):
         """
         Initialize the Downloader class.
 
         :param path: path to the download directory.
-        :param sample_packs: list of SamplePack objects.
+        :param sample_packs: iterable or async iterable of SamplePack objects,
+        added to the queue by `start`.
+        :param queue_size: max size of the download queue.
+        :param resume: resume partial downloads from their `.part` file.
+        :param retry: RetryScheduler object for failed downloads,
+        None for a default RetryScheduler.
+        :param segment_threshold: min size in bytes of a file to download
+        in segments. 0 disables segmented downloads.
+        :param segments: number of byte ranges a large file is split into.
+        :param host_segments: max extra segment connections per host,
+        shared by all workers.
+        :param manifest: Manifest object to record completed downloads in.
+        :param controller: AdaptiveConcurrency object to adjust the
+        amount of workers with, or None for a fixed amount.
+        :param on_download: coroutine function called with
+        each SamplePack object, as soon as it is downloaded.
+        :param limiter: RateLimiter object to limit the bandwidth with, or None.
+        :param policy: scheduling policy of the download queue, see scheduler.POLICIES.
+        :param metrics: StageMetrics object to record the downloads in, or None.
+        :param chunk_size: chunk size to read the responses in.
         """
         self._path = path
         self._sample_packs = sample_packs
-        self._main_queue = asyncio.Queue(maxsize=queue_size)
-        self._downloaded_files = []
+        self._resume = resume
+        self._retry = RetryScheduler() if retry is None else retry
+        self._segment_threshold = segment_threshold
+        self._segments = segments
+        self._host_segments = host_segments
+        self._host_budget = {}
+        self._manifest = manifest
+        self._controller = controller
+        self._main_queue = PackQueue(queue_size, policy)
+        self._metrics = metrics
+        if metrics is not None:
+            metrics.queue = self._main_queue
+        self._on_download = on_download
+        self._limiter = limiter
+        self._chunk_size = chunk_size
+        self._pool = None
+        self._downloaded = 0
+        self._downloaded_bytes = 0
+
+    @property
+    def downloaded(self) -> int:
+        """ The amount of sample packs downloaded. """
+        return self._downloaded
 
-    async def start(self, workers: int):
+    @property
+    def downloaded_bytes(self) -> int:
+        """ The amount of bytes downloaded. """
+        return self._downloaded_bytes
+
+    async def start(self, workers: int) -> int:
         # prepare workers to work on the queue
-        work_force = [asyncio.create_task(self._queue_worker(i))
-                      for i in range(workers)]
+        self.start_workers(workers)
 
         # start adding urls to the queue
         await self._create_download_queue()
 
+        return await self.stop()
+
+    def start_workers(self, workers: int):
+        """
+        Start the download workers, without adding sample packs to the queue.
+
+        Sample packs can then be added with `put`, while
+        the workers are downloading. Call `stop` when done.
+
+        :param workers: The amount of queue workers
+        """
+        self._pool = WorkerPool(self._queue_worker, workers, self._controller)
+        self._pool.start()
+
+    async def put(self, pack):
+        """
+        Add a sample pack to the download queue.
+
+        Waits for a free slot if the queue is full.
+
+        :param pack: SamplePack object.
+        """
+        log.debug(f'adding {pack.url} to download queue')
+        if self._metrics is not None:
+            self._metrics.add(pack.content_length)
+        await self._main_queue.put(pack)
+
+    async def stop(self) -> int:
+        """
+        Wait for the download queue to be empty, and stop the workers.
+
+        :return: The amount of sample packs downloaded.
+        """
         log.debug('calling queue.join()')
         # wait for all workers to be done
         await self._main_queue.join()
 
         log.debug('cancelling workers')
         # cancel workers.
-        for worker in work_force:
-            worker.cancel()
+        self._pool.cancel()
 
-        # return a list of SamplePack objects
-        return self._downloaded_files
+        return self._downloaded
 
     async def _create_download_queue(self):
-        for pack in self._sample_packs:
-            log.debug(f'adding {pack.url} to download queue')
-            await self._main_queue.put(pack)
+        if hasattr(self._sample_packs, '__aiter__'):
+            async for pack in self._sample_packs:
+                await self.put(pack)
+        else:
+            for pack in self._sample_packs:
+                await self.put(pack)
 
     async def _queue_worker(self, num: int):
 
-        while True:
+        while self._pool.is_active(num):
             pack = await self._main_queue.get()
             log.debug(f'worker-{num} downloading: {pack.url}')
+            await self._retry.handle(self._main_queue, pack, pack.url, self._handle_pack(num, pack))
 
-            path = self._path.joinpath(pack.file_name)
-            dl = await self._download(pack.url, path)
-            pack.path, pack.size, pack.content_length = dl
+    async def _handle_pack(self, num: int, pack):
+        """ Download a sample pack, and mark it done or failed. """
+        if not await self._download_pack(num, pack):
+            return
 
-            self._downloaded_files.append(pack)
+        try:
+            if self._on_download is not None:
+                await self._on_download(pack)
+        except Exception as e:
+            # the sample pack is downloaded, so it is not retried
+            log.error(f'handling download of {pack.file_name} failed: {e!r}', exc_info=True)
+        finally:
             self._main_queue.task_done()
 
+    async def _download_pack(self, num: int, pack) -> bool:
+        """
+        Download, verify and record a sample pack.
+
+        :return: True if downloaded, False if it was handed to the retry scheduler.
+        """
+        path = self._path.joinpath(pack.file_name)
+        hasher = hashlib.sha256()
+        dl = await self._timed_download(num, pack, path, hasher)
+
+        file_path, size, cl, headers, error, reason = dl
+
+        if error:
+            # keep the probed content length for the scheduling of the retry
+            self._retry.fail(self._main_queue, pack, pack.url, error, reason, headers)
+            return False
+
+        pack.path, pack.size, pack.content_length = file_path, size, cl
+
+        reason = await asyncio.to_thread(verify_file, pack.path, pack.size, pack.content_length)
+        if reason:
+            log.error(f'verification of {pack.path} failed: {reason}')
+            path.unlink(missing_ok=True)
+            self._retry.fail(self._main_queue, pack, pack.url, ERROR_INCOMPLETE, reason)
+            return False
+
+        if self._manifest is not None:
+            self._manifest.update(
+                pack,
+                etag=headers.get('ETag', ''),
+                last_modified=headers.get('Last-Modified', ''),
+                checksum=hasher.hexdigest()
+            )
+
+        self._downloaded += 1
+        self._downloaded_bytes += pack.size
+        return True
+
+    async def _timed_download(self, num: int, pack, path: Path, hasher) -> tuple:
+        progress = None
+        if self._metrics is not None or self._controller is not None:
+            progress = partial(self._on_chunk, num)
+        if self._metrics is not None:
+            self._metrics.start()
+
+        start = time.monotonic()
+        error = True
+        try:
+            dl = await self._download(pack.url, path, hasher, self._validator(pack), progress,
+                                      pack.content_length)
+            error = dl[4] != ''
+        finally:
+            if self._metrics is not None:
+                self._metrics.finish(time.monotonic() - start, error)
+
+        log.debug(f'downloaded {pack.url} in {time.monotonic() - start:.1f}s')
+
+        if self._controller is not None:
+            # latency is not comparable between files of different size,
+            # and the bytes are counted as they arrive
+            self._controller.record(error=dl[4] in CONGESTION_ERRORS)
+
+        return dl
+
+    def _on_chunk(self, num: int, nbytes: int):
+        # only the bytes received, not those resumed from disk
+        if self._metrics is not None:
+            self._metrics.add_bytes(num, nbytes)
+        if self._controller is not None:
+            self._controller.add_bytes(nbytes)
+
+    async def _download(self, url: str, path: Path, hasher, validator: str = '',
+                        progress=None, content_length: int = 0) -> tuple:
+        # a content length known from the probe or the manifest saves
+        # the HEAD request of a file too small to download in segments
+        segmented = self._segment_threshold > 0 and (
+            content_length == 0 or content_length >= self._segment_threshold)
+
+        if segmented and not Path(f'{path}.part').exists():
+            dl = await self._download_segmented(url, path, progress)
+            if dl is not None:
+                if dl[4] == '':
+                    # segments arrive out of order, so the file is hashed after
+                    await asyncio.to_thread(file_checksum, dl[0], hasher=hasher)
+                return dl
+
+        return await download_file(url, path, self._chunk_size, resume=self._resume,
+                                   hasher=hasher, limiter=self._limiter, if_range=validator,
+                                   progress=progress, pool=self.POOL, headers=self._headers())
+
+    async def _download_segmented(self, url: str, path: Path, progress=None):
+        """
+        Download a large file in byte ranges at the same time.
+
+        The finished ranges are recorded next to the `.segments` file,
+        so a failed or interrupted download only fetches the missing
+        ranges again, as long as the file did not change on the server.
+
+        Small files, and files the server will not serve ranges for,
+        are left for a normal download.
+
+        :param url: url of the file to download.
+        :param path: path and file name of the file to save.
+        :param progress: function called with the size of every chunk received.
+        :return: path, size, header content length, response headers,
+        error class and description of the error, or None to download
+        the file normally.
+        :rtype: tuple | None
+        """
+        response = await head(url, pool=self.POOL, headers=self._headers())
+        if response is None:
+            return '', 0, 0, {}, ERROR_CONNECTION, 'no response to HEAD request'
+
+        cl = int(response.headers.get('Content-Length', 0))
+        accept_ranges = response.headers.get('Accept-Ranges', '')
+        headers = response.headers
+        response.release()
+
+        if cl < self._segment_threshold or accept_ranges == 'none':
+            return None
+
+        segments = _Segments(Path(f'{path}.segments'))
+        validator = headers.get('ETag', '') or headers.get('Last-Modified', '')
+        if not self._resume or not segments.load(cl, validator):
+            segments.create(cl, self._segments, validator)
+
+        ranges = deque(segments.missing())
+
+        # the worker fetches ranges itself, helpers are only
+        # added while the host has segment connections to spare.
+        host = urlsplit(url).hostname
+        budget = self._host_budget.setdefault(host, asyncio.Semaphore(self._host_segments))
+
+        helpers = 0
+        try:
+            while helpers < len(ranges) - 1 and not budget.locked():
+                await budget.acquire()
+                helpers += 1
+
+            log.debug(f'downloading {url} in {len(ranges)} of {len(segments.ranges)} '
+                      f'segments, {helpers} helpers')
+            results = await asyncio.gather(*[self._fetch_segments(url, segments, ranges, progress)
+                                             for _ in range(helpers + 1)])
+        finally:
+            for _ in range(helpers):
+                budget.release()
+
+        if not all(results):
+            # the finished ranges are kept for the retry
+            return '', 0, cl, headers, ERROR_CONNECTION, 'a range request failed'
+
+        segments.replace(path)
+
+        return path, cl, cl, headers, '', ''
+
+    async def _fetch_segments(self, url: str, segments, ranges: deque, progress=None) -> bool:
+        while len(ranges) > 0:
+            start, end = ranges.popleft()
+            if await download_range(url, segments.path, start, end, self._chunk_size,
+                                    limiter=self._limiter, progress=progress,
+                                    pool=self.POOL, headers=self._headers()) == -1:
+                return False
+
+            await asyncio.to_thread(segments.finish, start, end)
+
+        return True
+
+    @staticmethod
+    def _validator(pack) -> str:
+        """ The If-Range validator of a probed sample pack, weak ETags are not allowed. """
+        if pack.etag and not pack.etag.startswith('W/'):
+            return pack.etag
+        return pack.last_modified
+
     @staticmethod
-    async def _download(url: str, path: str):
-        h = {
+    def _headers() -> dict:
+        return {
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
             'Accept-Encoding': 'gzip, deflate',
             'User-Agent': agent.random_agent(),
             'Connection': 'keep-alive'
         }
-        return await download_file(url, path, headers=h)
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2024 Nortxort
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import logging
+from html.parser import HTMLParser
+
+from bs4 import BeautifulSoup
+
+
+log = logging.getLogger(__name__)
+
+INDEX_ID = 'article-body'
+TEXT_COPY_CLASS = 'text-copy bodyCopy auto'
+
+# elements without an end tag, as treated by BeautifulSoup
+_VOID_ELEMENTS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen',
+    'link', 'menuitem', 'meta', 'param', 'source', 'track', 'wbr',
+    'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex',
+    'nextid', 'spacer'
+}
+
+# elements with strings that are not text, as BeautifulSoup puts
+# the strings inside them, at any depth, in other string classes.
+_NOT_TEXT = {'script', 'style', 'template', 'rt', 'rp'}
+
+# elements in which BeautifulSoup keeps strings of only whitespace
+_PRESERVE_WHITESPACE = {'pre', 'textarea'}
+
+_ASCII_SPACES = ' \n\t\x0c\r'
+
+# size of the parts a page is fed to the stream parser in
+_FEED_SIZE = 16 * 1024
+
+
+def _is_index(attrs: list) -> bool:
+    return ('id', INDEX_ID) in attrs
+
+
+def _is_text_copy(attrs: list) -> bool:
+    for name, value in attrs:
+        if name == 'class' and value is not None:
+            return ' '.join(value.split()) == TEXT_COPY_CLASS
+    return False
+
+
+class _AnchorParser(HTMLParser):
+    """
+    Collects the first anchor of every paragraph in a container element.
+
+    The container is the first element matching `is_container`. Once the
+    container is closed, `done` is set and the rest of the page is ignored.
+    """
+    def __init__(self, is_container):
+        """
+        Initialize the _AnchorParser class.
+
+        :param is_container: function taking the attributes of a start tag,
+        returning True if the element is the container.
+        """
+        super().__init__()
+        self._is_container = is_container
+        self.found = False
+        self.done = False
+        # paragraphs as [href, text] lists, None if without an anchor
+        self.paragraphs = []
+        self._stack = []
+        self._depth = 0
+        self._open_p = []
+        self._open_a = []
+        # data since the last tag, like a string of BeautifulSoup
+        self._data = []
+        self._not_text = 0
+        self._preserve = 0
+
+    def _push(self, tag: str, mark=None):
+        self._stack.append((tag, mark))
+        if tag in _NOT_TEXT:
+            self._not_text += 1
+        elif tag in _PRESERVE_WHITESPACE:
+            self._preserve += 1
+
+    def _pop(self):
+        tag, mark = self._stack.pop()
+        if tag in _NOT_TEXT:
+            self._not_text -= 1
+        elif tag in _PRESERVE_WHITESPACE:
+            self._preserve -= 1
+        return mark
+
+    def _flush(self):
+        if not self._data:
+            return
+
+        text = ''.join(self._data)
+        self._data = []
+
+        # like BeautifulSoup, a string of only whitespace becomes one space or newline
+        if self._preserve == 0 and text.strip(_ASCII_SPACES) == '':
+            text = '\n' if '\n' in text else ' '
+
+        if self._not_text == 0:
+            for anchor in self._open_a:
+                anchor[1].append(text)
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+
+        self._flush()
+
+        if not self.found:
+            if self._is_container(attrs):
+                self.found = True
+                self._depth = len(self._stack)
+            if tag not in _VOID_ELEMENTS:
+                self._push(tag)
+            return
+
+        if tag == 'a':
+            # the anchor is the first anchor of open paragraphs without one
+            anchor = None
+            for p in self._open_p:
+                if self.paragraphs[p] is None:
+                    if anchor is None:
+                        anchor = [dict(attrs).get('href') or '', []]
+                    self.paragraphs[p] = anchor
+
+            if anchor is not None:
+                self._open_a.append(anchor)
+                self._push(tag, anchor)
+                return
+
+        if tag == 'p':
+            self.paragraphs.append(None)
+            self._open_p.append(len(self.paragraphs) - 1)
+            self._push(tag, 'p')
+            return
+
+        if tag not in _VOID_ELEMENTS:
+            self._push(tag)
+
+    def handle_endtag(self, tag):
+        if self.done:
+            return
+
+        # BeautifulSoup ends the string, even if no tag is closed
+        self._flush()
+
+        # like BeautifulSoup, close the most recent open tag with this name
+        for i in range(len(self._stack) - 1, -1, -1):
+            if self._stack[i][0] == tag:
+                break
+        else:
+            return
+
+        while len(self._stack) > i:
+            mark = self._pop()
+            if mark == 'p':
+                self._open_p.pop()
+            elif mark is not None:
+                # anchors of different paragraphs can be equal, remove this one
+                for j in range(len(self._open_a) - 1, -1, -1):
+                    if self._open_a[j] is mark:
+                        del self._open_a[j]
+                        break
+
+        if self.found and len(self._stack) <= self._depth:
+            self.done = True
+
+    def handle_data(self, data):
+        if self.found and not self.done:
+            self._data.append(data)
+
+    def handle_comment(self, data):
+        self._flush()
+
+    def handle_decl(self, decl):
+        self._flush()
+
+    def handle_pi(self, data):
+        self._flush()
+
+    def unknown_decl(self, data):
+        self._flush()
+
+    def close(self):
+        super().close()
+        self._flush()
+
+    def anchors(self) -> list:
+        """ (href, text) tuples, or None for paragraphs without an anchor. """
+        return [None if p is None else (p[0], ''.join(p[1])) for p in self.paragraphs]
+
+
+def _stream(parser: _AnchorParser, html: str) -> _AnchorParser:
+    for i in range(0, len(html), _FEED_SIZE):
+        parser.feed(html[i:i + _FEED_SIZE])
+        if parser.done:
+            break
+    else:
+        parser.close()
+
+    return parser
+
+
+def _index_anchors(anchors: list) -> list:
+    urls = []
+    if len(anchors) > 8:
+        for anchor in anchors[9:-1]:
+            if anchor is not None:
+                urls.append(anchor[0])
+
+    return urls
+
+
+def _zip_anchors(anchors: list) -> list:
+    return [a for a in anchors if a is not None and a[0].endswith('.zip')]
+
+
+def stream_sample_page_urls(html: str) -> list:
+    parser = _stream(_AnchorParser(_is_index), html)
+    if not parser.found:
+        return []
+
+    return _index_anchors(parser.anchors())
+
+
+def stream_sample_packs(html: str):
+    parser = _stream(_AnchorParser(_is_text_copy), html)
+    if not parser.found:
+        return None
+
+    return _zip_anchors(parser.anchors())
+
+
+def bs4_sample_page_urls(html: str) -> list:
+    soup = BeautifulSoup(html, 'html.parser')
+    body = soup.find(attrs={'id': INDEX_ID})
+    if body is None:
+        return []
+
+    return _index_anchors([_bs4_anchor(p) for p in body.find_all('p')])
+
+
+def bs4_sample_packs(html: str):
+    soup = BeautifulSoup(html, 'html.parser')
+    text_copy_class = soup.find(attrs={'class': TEXT_COPY_CLASS})
+    if text_copy_class is None:
+        return None
+
+    return _zip_anchors([_bs4_anchor(p) for p in text_copy_class.find_all('p')])
+
+
+def _bs4_anchor(p):
+    if p.a is None:
+        return None
+    return p.a.get('href', ''), p.a.text
+
+
+BACKENDS = {
+    'stream': (stream_sample_page_urls, stream_sample_packs),
+    'bs4': (bs4_sample_page_urls, bs4_sample_packs),
+}
+
+
+def get_backend(name: str = 'stream') -> tuple:
+    """
+    Get the extraction functions of a backend.
+
+    sample_page_urls(html) returns the first anchor href of the index
+    paragraphs. sample_packs(html) returns (url, title) tuples of the zip
+    anchors on a sample page, or None if the page has no article text.
+
+    :param name: name of the backend, see BACKENDS.
+    :return: tuple of the sample_page_urls and sample_packs functions.
+    """
+    if name not in BACKENDS:
+        log.warning(f'unknown extraction backend {name}, using stream')
+        name = 'stream'
+
+    return BACKENDS[name]
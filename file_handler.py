@@ -24,9 +24,31 @@ FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 DEALINGS IN THE SOFTWARE.
 """
 
+import json
+import os
+import zipfile
 from pathlib import Path
 
 
+def write_json(path: Path, data):
+    """
+    Write data to a json file atomically.
+
+    The data is written to a temporary file first,
+    and then moved in place of the file at path.
+
+    :param path: path to the json file.
+    :param data: json serializable data.
+    """
+    tmp = path.with_name(f'{path.name}.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp, path)
+
+
 class FileHandler:
     """
     FileHandler class for various operation at the given path.
@@ -81,15 +103,19 @@ class FileHandler:
         """
         Create a directory.
         """
-        self._path.mkdir()
+        self._path.mkdir(parents=True, exist_ok=True)
         self._dir_created = True
 
     def iter_root_dir(self) -> list:
         """
         Iter the work path directory.
+
+        Hidden files and directories(e.g the manifest) are skipped.
         """
         if self._path.is_dir():
             for d in self._path.iterdir():
+                if d.name.startswith('.'):
+                    continue
                 if d.is_file() and d.name.endswith('.zip'):
                     # *.zip files in this folder is sample packs
                     self._old_samples.append(d.name)
@@ -98,12 +124,15 @@ class FileHandler:
 
         return self._old_samples
 
-    def compare(self, new_samples: list, old_samples: list) -> tuple:
+    def compare(self, new_samples: list, old_samples: list, manifest=None) -> tuple:
         """
         Compare two lists.
 
+        See `exists` for how a sample pack is matched.
+
         :param new_samples: list of SamplePack objects.
         :param old_samples: list of sample pack names.
+        :param manifest: Manifest object or None.
         :return: tuple of list(a) not in old samples and list(b) in old samples.
         """
         to_download = []
@@ -113,22 +142,33 @@ class FileHandler:
             to_download = new_samples
             return to_download, ignored
 
-        for sample in new_samples:
-            name = sample.file_name.replace('.zip', '')
+        old_names = set(old_samples)
 
-            if name not in self._remove_extension(old_samples):  # check old samples for .zip
-                to_download.append(sample)
-            else:
+        for sample in new_samples:
+            if self.exists(sample, old_names, manifest):
                 ignored.append(sample)
+            else:
+                to_download.append(sample)
 
         return to_download, ignored
 
-    @staticmethod
-    def _remove_extension(sample_list: list) -> list:
-        _ = []
-        for s in sample_list:
-            if s.endswith('.zip'):
-                s = s.replace('.zip', '')
-            _.append(s)
+    def exists(self, sample, old_names: set, manifest=None) -> bool:
+        """
+        Check if a sample pack is on the local system.
+
+        Sample packs with a manifest record must show a complete download.
+        Other sample packs are matched by name, and a zip file
+        must have an intact zip directory.
+
+        :param sample: SamplePack object.
+        :param old_names: set of sample pack names.
+        :param manifest: Manifest object or None.
+        :return: True if the sample pack does not need downloading.
+        """
+        if manifest is not None and sample.file_name in manifest:
+            return manifest.is_complete(sample.file_name)
+
+        if sample.file_name in old_names:
+            return zipfile.is_zipfile(self._path.joinpath(sample.file_name))
 
-        return _
+        return sample.key in old_names
@@ -24,17 +24,60 @@ FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 DEALINGS IN THE SOFTWARE.
 """
 
+import argparse
 import logging
 import asyncio
+import shutil
+import sys
 import time
+from contextlib import suppress
+from enum import IntEnum
+from pathlib import Path
+
+import config
 
 from file_handler import FileHandler
+from manifest import Manifest
+from crawl_state import CrawlState
+from concurrency import AdaptiveConcurrency
+from retry import RetryScheduler
 from musicradar import MusicRadarParser
 from downloader import Downloader
-from web import Session
+from process_downloader import ProcessDownloader
+from unpacker import Unpacker
+from scheduler import Schedule, LARGEST_FIRST, POLICIES
+from probe import Probe
+from metrics import Metrics
+from shard import Shard, Leases, shard_file_name
+from urllist import STDIN, read_urls, load_urls, write_urls, diff_urls
+from web import Session, ResponseCache, RateLimiter, PAGE_PROFILE, DOWNLOAD_PROFILE, \
+     ERROR_CLIENT
+
+
+# root path of the sample packs.
+# set to '' to ask for it, or to use ./samples when not in a terminal.
+ROOT_PATH = ''
+
+# level of the log messages shown, DEBUG, INFO, WARNING or ERROR.
+LOG_LEVEL = 'WARNING'
+
+# start downloading without asking for confirmation.
+YES = False
 
+# show the new sample packs, without downloading them.
+DRY_RUN = False
 
-DEBUG = True
+# only parse the sample pages, updating the crawl state and page cache.
+ONLY_CRAWL = False
+
+# file with sample pack urls to download(e.g urls.txt),
+# instead of parsing the sample pages. use - to read from stdin.
+FROM_URLS = ''
+
+# write the sample pack urls found by the parser to a file(e.g urls.txt),
+# and show the changes. all sample pages are parsed, ignoring the crawl state
+# and MAX_SAMPLE_PAGE_URLS.
+WRITE_URLS = ''
 
 # the max amount of sample page urls to process.
 # set to 0 to process all sample page urls.
@@ -43,6 +86,21 @@ MAX_SAMPLE_PAGE_URLS = 5
 # amounts of simultaneously parser connections.
 PARSER_WORKERS = 3
 
+# adjust the amount of parser and download workers to the
+# latency, errors and throughput of the server, starting at
+# PARSER_WORKERS and DOWNLOAD_WORKERS.
+ADAPTIVE_WORKERS = True
+
+# max amount of parser workers, when adaptive.
+MAX_PARSER_WORKERS = 8
+
+# max amount of download workers, when adaptive.
+MAX_DOWNLOAD_WORKERS = 12
+
+# amount of processes to parse pages in.
+# set to 0 to parse pages in the main process.
+PARSER_PROCESSES = 2
+
 # max size of the parser queue.
 # https://docs.python.org/3/library/asyncio-queue.html#asyncio.Queue
 PARSER_QUEUE_MAX_SIZE = 0
@@ -50,14 +108,118 @@ PARSER_QUEUE_MAX_SIZE = 0
 # amount of simultaneously download connections.
 DOWNLOAD_WORKERS = 5
 
+# amount of processes to download in, each with DOWNLOAD_WORKERS connections.
+# set to 0 to download in the main process.
+DOWNLOAD_PROCESSES = 0
+
 # max size of the download queue.
 DOWNLOAD_QUEUE_MAX_SIZE = 150
 
+# probe the size of the new sample packs with HEAD requests before
+# downloading, and show the total size and download time. in a pipelined
+# run, every sample pack is probed before it is queued, and the total is
+# shown when all sample pages are parsed.
+PREFLIGHT = True
+
+# amount of simultaneously HEAD requests of the probe.
+PREFLIGHT_WORKERS = 16
+
+# download rate(in bytes per second) used to estimate the download time,
+# when MAX_DOWNLOAD_RATE is 0.
+EXPECTED_DOWNLOAD_RATE = 10 * 1024 * 1024
+
+# order to download the sample packs in,
+# 'fifo', 'largest', 'smallest' or 'interleave'(take turns between sample pages).
+# 'largest' and 'smallest' need the size of the sample packs, from the PREFLIGHT
+# probe or an earlier download, the sample packs of unknown size are downloaded last.
+# in a pipelined run only the sample packs waiting in the download queue are ordered.
+DOWNLOAD_ORDER = LARGEST_FIRST
+
+# start downloading sample packs while the sample pages are still parsed.
+PIPELINE = True
+
+# only parse sample pages not parsed on earlier runs.
+INCREMENTAL_CRAWL = True
+
+# seconds before a sample page parsed on an earlier run is parsed again.
+# set to 0 to never parse a sample page again.
+CRAWL_MAX_AGE = 30 * 24 * 60 * 60
+
+# max size(in bytes) of the page cache in the root directory.
+# set to 0 to disable the page cache.
+PAGE_CACHE_MAX_SIZE = 64 * 1024 * 1024
+
+# files larger than this(in bytes) are downloaded in segments.
+# set to 0 to download all files in a single connection.
+SEGMENT_THRESHOLD = 100 * 1024 * 1024
+
+# amount of segments a large file is split into.
+SEGMENTS = 4
+
+# max amount of extra segment connections per host,
+# shared between all download workers.
+HOST_SEGMENTS = 4
+
+# max download bandwidth(in bytes per second) of all downloads.
+# set to 0 for no limit.
+MAX_DOWNLOAD_RATE = 0
+
+# max download bandwidth(in bytes per second) per host.
+# set to 0 for no limit.
+MAX_HOST_DOWNLOAD_RATE = 0
+
+# show a line with the progress of the parser and downloader.
+# shown by default when stderr is a terminal, not e.g when logging to a file.
+PROGRESS = sys.stderr.isatty()
+
+# file to export the metrics to, as json, or as Prometheus text
+# if the file name ends with .prom. set to '' to not export the metrics.
+METRICS_FILE = ''
+
+# seconds between updates of the progress line and metrics file.
+METRICS_INTERVAL = 1.0
+
+# split the sample packs over this many shards, e.g hosts or processes,
+# each running with a different SHARD. set to 1 to not split them.
+SHARDS = 1
+
+# the shard to download, from 0 to SHARDS - 1.
+SHARD = 0
+
+# directory for the leases of the sample packs, shared by the shards.
+# set to '' to use the root path.
+LEASE_DIR = ''
+
+# seconds before the lease of a stopped shard can be taken over.
+LEASE_TIMEOUT = 600
+
+# unpack the sample packs as they are downloaded.
+UNPACK = False
+
+# amount of zip files unpacked at the same time.
+UNPACK_PROCESSES = 2
+
+# delete the zip files after unpacking them.
+DELETE_ZIP = False
+
 
 log = logging.getLogger(__name__)
 
 
-def set_logger():
+class ExitCode(IntEnum):
+    OK = 0
+    # invalid path or config
+    ERROR = 1
+    # invalid command line arguments
+    USAGE = 2
+    # sample packs or pages failed after all retries
+    FAILED = 3
+    # the download was not confirmed
+    ABORTED = 4
+    INTERRUPTED = 130
+
+
+def set_logger(level: str = 'WARNING'):
 
     fmt = ('%(asctime)s,%(msecs)03d:%(levelname)s:'
            'L%(lineno)d:%(filename)s:'
@@ -66,15 +228,299 @@ def set_logger():
     logging.basicConfig(
         format=fmt,
         datefmt='%d/%m/%Y %H:%M:%S',
-        level=logging.DEBUG
+        level=level.upper()
     )
 
 
-if DEBUG:
-    set_logger()
+def confirm(message: str) -> bool:
+    """ Ask to continue, unless YES is set. """
+    if YES:
+        print(message.replace('Press enter to start', 'Starting'))
+        return True
+
+    try:
+        input(message)
+        return True
+    except EOFError:
+        print('\nNo confirmation(use --yes when not in a terminal), quitting.')
+        return False
+
+
+async def run_sequential(fh, old_samples, manifest, dl, retry, metrics, sample_packs) -> bool:
+    """ Find all new sample packs, and then download them. """
+    old_names = set(old_samples)
+    downloads = []
+    found = 0
+    ignored = 0
+
+    report = start_report(metrics)
+
+    # only the new sample packs are kept until the download starts
+    async for sp in sample_packs:
+        found += 1
+        if fh.exists(sp, old_names, manifest):
+            ignored += 1
+        else:
+            downloads.append(known_size(sp, manifest))
+
+    await stop_report(report)
+
+    print(f'found {found} sample packs urls')
+    print(f'ignored {ignored} sample packs already on local system.')
+
+    if PREFLIGHT and len(downloads) > 0:
+        downloads = await preflight(fh, downloads, retry)
+
+    if len(downloads) == 0:
+        print('There is nothing to download.')
+        return True
+
+    if DRY_RUN:
+        print(f'\n---Would download {len(downloads)} sample packs---')
+        for sp in Schedule(DOWNLOAD_ORDER).order(downloads):
+            size = format_size(sp.content_length) if sp.content_length > 0 else 'unknown size'
+            print(f'{sp.file_name}, ({size}) <- {sp.url}')
+        return True
+
+    if not confirm(f'Press enter to start downloading {len(downloads)} sample packs.'):
+        return False
+
+    print(f'\nStarting downloader, this will take a while...')
+
+    start = time.time()
+
+    dl.start_workers(workers=DOWNLOAD_WORKERS)
+
+    report = start_report(metrics)
+
+    for sp in Schedule(DOWNLOAD_ORDER).order(downloads):
+        await dl.put(sp)
+
+    await dl.stop()
+    await stop_report(report)
+    print_results(dl, start)
+    return True
+
+
+async def run_pipelined(fh, old_samples, manifest, dl, retry, metrics, sample_packs) -> bool:
+    """ Download new sample packs, while they are found. """
+    old_names = set(old_samples)
+    found = 0
+    ignored = 0
+
+    if not confirm('Press enter to start parsing and downloading new sample packs.'):
+        return False
+
+    print('\nStarting parser and downloader, this will take a while...')
+
+    start = time.time()
+
+    dl.start_workers(workers=DOWNLOAD_WORKERS)
+
+    report = start_report(metrics)
+
+    async def new_packs():
+        nonlocal found, ignored
+        async for sp in sample_packs:
+            found += 1
+            if fh.exists(sp, old_names, manifest):
+                ignored += 1
+            else:
+                yield known_size(sp, manifest)
+
+    downloads = new_packs()
+    probe = None
+    if PREFLIGHT:
+        # the size of a sample pack is needed in the download queue, to order it
+        probe = Probe(PREFLIGHT_WORKERS, Downloader.POOL)
+        downloads = probe.stream(downloads)
+
+    # bytes left to download of the probed sample packs, when they were queued
+    remaining = 0
+    disk_space = True
+
+    async for sp in downloads:
+        if probe is not None:
+            remaining += remaining_size(fh, sp)
+            if disk_space:
+                # warn once, as soon as the sample packs found do not fit
+                disk_space = check_disk_space(fh, remaining - metrics.download.bytes)
+        await dl.put(sp)
+
+    # clear the progress line first
+    prefix = '\r\033[K' if PROGRESS else ''
+    print(f'{prefix}found {found} sample packs urls')
+    print(f'ignored {ignored} sample packs already on local system.')
+
+    if probe is not None:
+        for sp in probe.dead:
+            retry.add_dead_letter(sp.url, ERROR_CLIENT, 'dead link')
+
+        print_probe(probe, max(0, remaining - metrics.download.bytes))
+
+    await dl.stop()
+    await stop_report(report)
+    print_results(dl, start)
+    return True
+
 
+async def run_crawl(metrics, sample_packs):
+    """ Parse the sample pages, without downloading. """
+    parsed = 0
 
-async def run(path: str):
+    report = start_report(metrics)
+    async for _ in sample_packs:
+        parsed += 1
+    await stop_report(report)
+
+    print(f'parsed {parsed} sample packs urls')
+
+
+async def collect_urls(sample_packs, urls: list):
+    """ Keep the urls of the sample packs passing through. """
+    async for sp in sample_packs:
+        urls.append(sp.url)
+        yield sp
+
+
+def update_urls(path: Path, urls: list, complete: bool):
+    """ Write the urls found to a file, and show the changes. """
+    old_urls = load_urls(path)
+    added, removed = diff_urls(old_urls, urls)
+
+    if not complete and len(removed) > 0:
+        # pages that failed may have had the missing urls
+        print(f'\nKeeping {len(removed)} urls not found, since some requests failed.')
+        urls = urls + removed
+        removed = []
+
+    write_urls(path, urls)
+
+    print(f'\nWrote {len(set(urls))} sample pack urls to {path}, '
+          f'{len(added)} added, {len(removed)} removed.')
+    for url in added:
+        print(f'+ {url}')
+    for url in removed:
+        print(f'- {url}')
+
+
+async def preflight(fh, downloads, retry):
+    """ Probe the sample packs, and show the download size and time. """
+    print(f'\nProbing {len(downloads)} sample packs..')
+
+    probe = Probe(PREFLIGHT_WORKERS, Downloader.POOL)
+    downloads = await probe.start(downloads)
+
+    for sp in probe.dead:
+        retry.add_dead_letter(sp.url, ERROR_CLIENT, 'dead link')
+
+    remaining = sum(remaining_size(fh, sp) for sp in downloads)
+    print_probe(probe, remaining)
+    check_disk_space(fh, remaining)
+
+    return downloads
+
+
+def remaining_size(fh, sp) -> int:
+    """ The bytes left to download of a probed sample pack, partial downloads are resumed. """
+    part = fh.path.joinpath(f'{sp.file_name}.part')
+    return max(0, sp.content_length - (part.stat().st_size if part.is_file() else 0))
+
+
+def print_probe(probe, remaining: int):
+    """ Show the results of a probe, and the download time of the remaining bytes. """
+    rate = MAX_DOWNLOAD_RATE or EXPECTED_DOWNLOAD_RATE
+
+    print(f'{len(probe.dead)} dead links, {probe.failed} sample packs could not be probed.')
+    print(f'{format_size(probe.total_bytes)} to download, {format_size(remaining)} remaining, '
+          f'about {format_time(remaining / rate)} at {format_size(rate)}/s.')
+    if probe.unknown > 0:
+        print(f'The size of {probe.unknown} sample packs is unknown.')
+
+
+def check_disk_space(fh, remaining: int) -> bool:
+    """ Warn if the remaining bytes do not fit on the disk. """
+    free = shutil.disk_usage(fh.path).free
+    if remaining > free:
+        # clear the progress line first
+        prefix = '\r\033[K' if PROGRESS else ''
+        print(f'{prefix}WARNING: only {format_size(free)} free disk space at {fh.path}.')
+        return False
+    return True
+
+
+def format_size(size: float) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return f'{size:.1f} {unit}'
+        size /= 1024
+    return f'{size:.1f} TB'
+
+
+def format_time(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours}:{minutes:02}:{seconds:02}'
+
+
+def known_size(sp, manifest):
+    """ Set the content length of a sample pack from an earlier download, for the scheduling. """
+    record = manifest.get(sp.file_name)
+    if record is not None:
+        sp.content_length = record['content_length']
+    return sp
+
+
+def parser_controller():
+    if ADAPTIVE_WORKERS:
+        return AdaptiveConcurrency(PARSER_WORKERS, maximum=MAX_PARSER_WORKERS, interval=2.0)
+
+
+def download_controller():
+    if ADAPTIVE_WORKERS:
+        return AdaptiveConcurrency(DOWNLOAD_WORKERS, maximum=MAX_DOWNLOAD_WORKERS, interval=10.0)
+
+
+def start_report(metrics):
+    """ Start showing and exporting the metrics, if enabled. """
+    if PROGRESS or METRICS_FILE:
+        path = Path(METRICS_FILE) if METRICS_FILE else None
+        return asyncio.create_task(metrics.report(METRICS_INTERVAL, PROGRESS, path))
+
+
+async def stop_report(report):
+    if report is not None:
+        report.cancel()
+        with suppress(asyncio.CancelledError):
+            await report
+
+
+async def print_download(sp):
+    # clear the progress line first
+    prefix = '\r\033[K' if PROGRESS else ''
+    print(f'{prefix}downloaded {sp.file_name}, ({sp.size}) -> {sp.path}')
+
+
+def print_results(dl, start: float):
+    if dl.downloaded == 0:
+        print('Nothing was downloaded.')
+    else:
+        t = time.strftime('%H:%M:%S', time.gmtime(time.time() - start))
+        print(f'\nDownloaded {dl.downloaded} sample packs '
+              f'({dl.downloaded_bytes} bytes) in {t}.')
+
+
+def create_parser(cache, crawl_state, retry, metrics):
+    # a urls file is only complete with all sample pages
+    pages_num = 0 if WRITE_URLS else MAX_SAMPLE_PAGE_URLS
+    return MusicRadarParser(PARSER_QUEUE_MAX_SIZE, pages_num,
+                            cache, crawl_state,
+                            processes=PARSER_PROCESSES,
+                            controller=parser_controller(),
+                            retry=retry, metrics=metrics.parser)
+
+
+async def run(path: str) -> ExitCode:
     old_samples = []
 
     fh = FileHandler(path)
@@ -84,67 +530,253 @@ async def run(path: str):
         fh.create_dir()
         if not fh.is_dir():
             print(f'Failed to create directory at {fh.path}, quitting.')
-            return
+            return ExitCode.ERROR
         else:
             print(f'Successfully created directory at {fh.path}')
 
     if not fh.is_dir():
         print(f'{fh.path} is not a directory, quitting.')
-        return
+        return ExitCode.ERROR
+
+    shard = None
+    if SHARDS > 1:
+        shard = Shard(SHARD, SHARDS)
+        shard.leases = Leases(LEASE_DIR or fh.path.joinpath(Leases.DIR_NAME),
+                              Leases.owner_name(shard.name), LEASE_TIMEOUT)
+        print(f'Downloading shard {shard.name}, leases at {shard.leases.path}')
+
+    manifest = Manifest(fh.path, shard=None if shard is None else shard.name)
 
     if not fh.was_dir_created:
         old_samples = fh.iter_root_dir()
+        manifest.load()
 
         print(f'Found {len(old_samples)} sample packs at {fh.path}')
 
         for old in old_samples:
-            print(f'pack on system: {old}')
+            log.info(f'pack on system: {old}')
+
+    # separate connection pools, so downloads can not starve page requests
+    Session.create_pool(Downloader.POOL, DOWNLOAD_PROFILE,
+                        limit_per_host=max(DOWNLOAD_WORKERS, MAX_DOWNLOAD_WORKERS) + HOST_SEGMENTS)
+
+    retry = RetryScheduler()
+    metrics = Metrics(retry)
+    confirmed = True
+    urls = []
+
+    try:
+        if FROM_URLS:
+            # the sample pages are not needed, so the downloads start right away
+            print(f'Reading sample pack urls from {"stdin" if FROM_URLS == STDIN else FROM_URLS}')
+            sample_packs = read_urls(FROM_URLS)
+        else:
+            sample_packs = start_parser(fh, retry, metrics)
+            if WRITE_URLS:
+                sample_packs = collect_urls(sample_packs, urls)
+
+        if ONLY_CRAWL:
+            await run_crawl(metrics, sample_packs)
+        elif shard is not None:
+            confirmed = await run_shard(fh, old_samples, manifest, retry, metrics, sample_packs, shard)
+        else:
+            confirmed = await run_downloads(fh, old_samples, manifest, retry, metrics, sample_packs)
+            if not DRY_RUN:
+                # the manifests of sharded runs are merged, even when nothing was downloaded
+                manifest.merge()
+    finally:
+        await Session.close()
 
-    print('Starting parser..')
+    if WRITE_URLS and confirmed:
+        # without any urls, the index page most likely could not be parsed
+        update_urls(Path(WRITE_URLS), urls, len(retry.dead_letters) == 0 and len(urls) > 0)
 
-    parser = MusicRadarParser(PARSER_QUEUE_MAX_SIZE, MAX_SAMPLE_PAGE_URLS)
-    sample_packs = await parser.start(workers=PARSER_WORKERS)
+    if len(retry.dead_letters) > 0:
+        file_name = retry.FILE_NAME if shard is None else shard_file_name(retry.FILE_NAME, shard.name)
+        print(f'\n---Failed---\n{retry.report()}')
+        print(f'Failed urls were saved to {retry.save(fh.path, file_name)}')
+        return ExitCode.FAILED
 
-    print(f'parsed {len(sample_packs)} sample packs urls')
+    return ExitCode.OK if confirmed else ExitCode.ABORTED
 
-    downloads = []
 
-    if len(old_samples) > 0:
-        print('\nComparing files.')
-        downloads, ignored = fh.compare(parser.sample_packs, old_samples)
-        print(f'ignored {len(ignored)} sample packs already on local system.')
-    else:
-        downloads.extend(parser.sample_packs)
+def start_parser(fh, retry, metrics):
+    """ The sample packs found by the parser. """
+    cache = None
+    if PAGE_CACHE_MAX_SIZE > 0:
+        cache = ResponseCache(fh.path.joinpath('.cache'), PAGE_CACHE_MAX_SIZE)
+        cache.load()
 
-    if len(downloads) == 0:
-        print('There is nothing to download.')
+    # shards sharing a root directory would overwrite each others cache and crawl state
+    if SHARDS > 1:
+        cache = None
+
+    crawl_state = None
+    if INCREMENTAL_CRAWL and not WRITE_URLS and SHARDS == 1:
+        crawl_state = CrawlState(fh.path, CRAWL_MAX_AGE)
+        print(f'Found {crawl_state.load()} sample pages parsed on earlier runs')
+
+    Session.create_pool(MusicRadarParser.POOL, PAGE_PROFILE,
+                        limit_per_host=max(PARSER_WORKERS, MAX_PARSER_WORKERS))
+
+    print('Starting parser..')
+    parser = create_parser(cache, crawl_state, retry, metrics)
+    return parser.iter_sample_packs(workers=PARSER_WORKERS)
+
+
+async def run_shard(fh, old_samples, manifest, retry, metrics, sample_packs, shard) -> bool:
+    """ Download the sample packs of a shard, and merge the manifests. """
+    sample_packs = shard.filter(sample_packs, fh.path, set(old_samples))
+
+    shard.leases.start()
+    try:
+        confirmed = await run_downloads(fh, old_samples, manifest, retry, metrics, sample_packs)
+    finally:
+        await shard.leases.stop()
+
+    print(f'skipped {shard.skipped} sample packs of other shards, '
+          f'and {shard.leased} sample packs leased by other shards.')
+
+    # other shards may merge at the same time
+    async with shard.leases.lock('.manifest'):
+        print(f'Merged {manifest.merge()} manifest records into {Manifest.FILE_NAME}')
+
+    return confirmed
+
+
+async def run_downloads(fh, old_samples, manifest, retry, metrics, sample_packs) -> bool:
+    """ Find and download the new sample packs. """
+    unpacker = None
+    if UNPACK and not DRY_RUN:
+        unpacker = Unpacker(UNPACK_PROCESSES, delete=DELETE_ZIP)
+        unpacker.start()
+
+    async def on_download(sp):
+        await print_download(sp)
+        if unpacker is not None:
+            await unpacker.put(sp)
+
+    if DOWNLOAD_PROCESSES > 0:
+        dl = ProcessDownloader(fh.path, DOWNLOAD_PROCESSES,
+                               queue_size=DOWNLOAD_QUEUE_MAX_SIZE,
+                               manifest=manifest,
+                               retry=retry,
+                               on_download=on_download,
+                               policy=DOWNLOAD_ORDER,
+                               metrics=metrics.download,
+                               rate=MAX_DOWNLOAD_RATE,
+                               host_rate=MAX_HOST_DOWNLOAD_RATE,
+                               host_segments=HOST_SEGMENTS,
+                               controller=download_controller(),
+                               log_level=logging.getLogger().level,
+                               segment_threshold=SEGMENT_THRESHOLD,
+                               segments=SEGMENTS)
+    else:
+        dl = Downloader(fh.path, queue_size=DOWNLOAD_QUEUE_MAX_SIZE,
+                        segment_threshold=SEGMENT_THRESHOLD,
+                        segments=SEGMENTS,
+                        host_segments=HOST_SEGMENTS,
+                        manifest=manifest,
+                        controller=download_controller(),
+                        retry=retry,
+                        on_download=on_download,
+                        limiter=RateLimiter(MAX_DOWNLOAD_RATE, MAX_HOST_DOWNLOAD_RATE),
+                        policy=DOWNLOAD_ORDER,
+                        metrics=metrics.download)
+
+    # a dry run needs all sample packs before it can show them
+    if PIPELINE and not DRY_RUN:
+        confirmed = await run_pipelined(fh, old_samples, manifest, dl, retry, metrics, sample_packs)
     else:
-        input(f'Press enter to start downloading {len(downloads)} sample packs.')
+        confirmed = await run_sequential(fh, old_samples, manifest, dl, retry, metrics, sample_packs)
 
-        dl = Downloader(fh.path, downloads, DOWNLOAD_QUEUE_MAX_SIZE)
-        print(f'\nStarting downloader, this will take a while...')
+    if unpacker is not None:
+        print('\nWaiting for the sample packs to be unpacked..')
+        await unpacker.stop()
+        print(f'Unpacked {unpacker.unpacked} sample packs ({unpacker.unpacked_bytes} bytes), '
+              f'{unpacker.failed} failed.')
 
-        start = time.time()
+    return confirmed
 
-        results = await dl.start(workers=DOWNLOAD_WORKERS)
-        if len(results) == 0:
-            print('Nothing was downloaded.')
-        else:
-            print('\n---Downloaded packs---')
-            for sp in results:
-                print(f'{sp.file_name}, ({sp.size}) -> {sp.path}')
 
-            t = time.strftime('%H:%M:%S', time.gmtime(time.time() - start))
-            print(f'\nDownloaded {len(downloads)} sample packs in {t}.')
+def parse_args(argv: list = None) -> argparse.Namespace:
+    defaults = config.settings(sys.modules[__name__])
+
+    parser = argparse.ArgumentParser(
+        description='Download the free sample packs of musicradar.',
+        epilog='Settings are applied from their default in main.py, '
+               'the config file and the command line, in that order.')
+    parser.add_argument('path', nargs='?', default=argparse.SUPPRESS,
+                        help='root path of the sample packs.')
+    parser.add_argument('-c', '--config', help='json file with settings, '
+                                               'e.g {"download_workers": 8}.')
+    config.add_arguments(parser, defaults, config.descriptions(sys.modules[__name__]),
+                         aliases={'YES': ['-y']})
+
+    return parser.parse_args(argv)
+
+
+def configure(args: argparse.Namespace):
+    """ Apply the settings of the config file and arguments to this module. """
+    defaults = config.settings(sys.modules[__name__])
+
+    values = {}
+    if args.config:
+        values.update(config.load(args.config, defaults))
+
+    values.update({name: value for name, value in vars(args).items() if name in defaults})
+    if 'path' in args:
+        values['ROOT_PATH'] = args.path
+
+    if values.get('DOWNLOAD_ORDER', DOWNLOAD_ORDER) not in POLICIES:
+        raise config.ConfigError(f'download_order must be one of {", ".join(POLICIES)}')
+
+    if not isinstance(logging.getLevelName(values.get('LOG_LEVEL', LOG_LEVEL).upper()), int):
+        raise config.ConfigError('log_level must be DEBUG, INFO, WARNING or ERROR')
+
+    globals().update(values)
+
+
+def main(argv: list = None) -> int:
+    args = parse_args(argv)
+
+    try:
+        configure(args)
+    except config.ConfigError as e:
+        print(f'config error: {e}', file=sys.stderr)
+        return ExitCode.USAGE
+
+    if FROM_URLS and FROM_URLS != STDIN and not Path(FROM_URLS).is_file():
+        print(f'urls file {FROM_URLS} does not exist.', file=sys.stderr)
+        return ExitCode.USAGE
+
+    if FROM_URLS == STDIN and not (YES or DRY_RUN):
+        # input() would read the urls
+        print('reading urls from stdin needs --yes.', file=sys.stderr)
+        return ExitCode.USAGE
+
+    if not 0 <= SHARD < SHARDS:
+        print(f'shard must be from 0 to {SHARDS - 1}.', file=sys.stderr)
+        return ExitCode.USAGE
 
-    await Session.close()
+    if FROM_URLS and WRITE_URLS:
+        print('--write-urls needs the parser, it can not be used with --from-urls.', file=sys.stderr)
+        return ExitCode.USAGE
 
+    set_logger(LOG_LEVEL)
 
-def main():
-    path = input('\nEnter root path [default = ./samples]: ') or './samples'
+    path = ROOT_PATH
+    if not path:
+        if sys.stdin.isatty() and not YES:
+            path = input('\nEnter root path [default = ./samples]: ')
+        path = path or './samples'
 
-    asyncio.run(run(path))
+    try:
+        return asyncio.run(run(path))
+    except KeyboardInterrupt:
+        print('\nInterrupted.')
+        return ExitCode.INTERRUPTED
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
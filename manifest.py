@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2024 Nortxort
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import json
+import hashlib
+import logging
+import zipfile
+from pathlib import Path
+
+from file_handler import write_json
+from shard import shard_file_name
+
+
+log = logging.getLogger(__name__)
+
+
+def file_checksum(path: str, chunk_size: int = 1024 * 1024, hasher=None) -> str:
+    """
+    Calculate the sha256 checksum of a file.
+
+    :param path: path to the file.
+    :param chunk_size: chunk size to read the file in.
+    :param hasher: hashlib object to update, instead of a new sha256 object.
+    :return: hex digest of the file.
+    """
+    h = hashlib.sha256() if hasher is None else hasher
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                break
+            h.update(data)
+
+    return h.hexdigest()
+
+
+def verify_file(path: str, size: int, content_length: int) -> str:
+    """
+    Check a downloaded file for truncation and corruption.
+
+    The size on disk must match the downloaded size and the content length,
+    and a zip file must have a readable central directory. The central
+    directory is at the end of the file, so this does not read the members.
+
+    :param path: path to the file.
+    :param size: the amount of bytes downloaded.
+    :param content_length: the content length header, 0 if unknown.
+    :return: the reason the file failed, or an empty string if it is fine.
+    """
+    disk_size = Path(path).stat().st_size
+    if disk_size != size:
+        return f'size on disk {disk_size}, downloaded {size} bytes'
+
+    if 0 < content_length != size:
+        return f'size {size}, content length {content_length}'
+
+    if str(path).endswith('.zip'):
+        try:
+            with zipfile.ZipFile(path) as z:
+                # members are stored before the central directory
+                for info in z.infolist():
+                    end = info.header_offset + info.compress_size
+                    if info.header_offset < 0 or end > z.start_dir:
+                        return f'zip member {info.filename} is outside the file'
+        except (zipfile.BadZipFile, OSError, ValueError) as e:
+            return f'bad zip file: {e}'
+
+    return ''
+
+
+class Manifest:
+    """
+    Manifest of downloaded sample packs.
+
+    The manifest is stored as a json file in the root directory,
+    and loaded into an index keyed by the sample pack file name.
+
+    A shard saves its records to a manifest file of its own, so shards
+    sharing a root directory do not overwrite each others records.
+    The manifests of all shards are loaded along with the main manifest,
+    and merged into it with `merge`.
+    """
+    FILE_NAME = '.sample-rip.json'
+
+    def __init__(self, path: str, shard: str = None):
+        """
+        Initialize the Manifest class.
+
+        :param path: path to the root directory.
+        :param shard: the shard name, or None for the main manifest.
+        """
+        self._root = Path(path)
+        self._main_path = self._root.joinpath(self.FILE_NAME)
+        self._path = self._main_path
+        if shard is not None:
+            self._path = self._root.joinpath(shard_file_name(self.FILE_NAME, shard))
+
+        self._index = {}
+        # the records saved to the manifest file of a shard
+        self._own = {}
+
+    @property
+    def path(self) -> Path:
+        """ path to the manifest file. """
+        return self._path
+
+    def __contains__(self, file_name: str) -> bool:
+        return file_name in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    @property
+    def is_shard(self) -> bool:
+        return self._path != self._main_path
+
+    def _shard_paths(self) -> list:
+        return sorted(self._root.glob(shard_file_name(self.FILE_NAME, '*')))
+
+    @staticmethod
+    def _read(path: Path) -> dict:
+        if path.is_file():
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    records = json.load(f).get('packs', [])
+            except (OSError, ValueError) as e:
+                log.error(f'failed to load manifest {path}: {e}')
+            else:
+                return {r['file_name']: r for r in records}
+        return {}
+
+    def load(self) -> int:
+        """
+        Load the main manifest, and the manifests of the shards, into the index.
+
+        :return: the amount of records loaded.
+        """
+        self._index = self._read(self._main_path)
+        for path in self._shard_paths():
+            records = self._read(path)
+            self._index.update(records)
+            if path == self._path:
+                self._own = records
+
+        log.debug(f'loaded {len(self._index)} manifest records')
+        return len(self._index)
+
+    def merge(self) -> int:
+        """
+        Merge the manifests of all shards into the main manifest.
+
+        The manifests are loaded again, to include the records
+        saved by other shards since they were loaded.
+
+        :return: the amount of records in the main manifest.
+        """
+        self.load()
+        # the manifest of this shard may have been replaced meanwhile
+        self._index.update(self._own)
+        write_json(self._main_path, {'version': 1, 'packs': list(self._index.values())})
+        return len(self._index)
+
+    def get(self, file_name: str):
+        """
+        Get the record of a sample pack.
+
+        :param file_name: the sample pack file name.
+        :return: the record dictionary or None.
+        :rtype: dict | None
+        """
+        return self._index.get(file_name)
+
+    def is_complete(self, file_name: str) -> bool:
+        """
+        Check if a sample pack was completely downloaded.
+
+        A sample pack is complete, if the size matches the content length,
+        and the zip file on disk still has that size. A directory with the
+        name of the sample pack is considered an unpacked sample pack.
+
+        :param file_name: the sample pack file name.
+        :return: True if complete, else False.
+        """
+        record = self._index.get(file_name)
+        if record is None or record['size'] == 0:
+            return False
+
+        if 0 < record['content_length'] != record['size']:
+            return False
+
+        zip_path = self._root.joinpath(file_name)
+        if zip_path.is_file():
+            return zip_path.stat().st_size == record['size']
+
+        return self._root.joinpath(file_name.replace('.zip', '')).is_dir()
+
+    def update(self, pack, etag: str = '', last_modified: str = '',
+               checksum: str = ''):
+        """
+        Add or replace the record of a downloaded sample pack,
+        and save the manifest.
+
+        :param pack: SamplePack object.
+        :param etag: the ETag header of the download.
+        :param last_modified: the Last-Modified header of the download.
+        :param checksum: sha256 hex digest of the verified file.
+        """
+        record = {
+            'file_name': pack.file_name,
+            'url': pack.url,
+            'page_url': pack.page_url,
+            'size': pack.size,
+            'content_length': pack.content_length,
+            'etag': etag,
+            'last_modified': last_modified,
+            'checksum': checksum
+        }
+        self._index[pack.file_name] = record
+        self._own[pack.file_name] = record
+        self.save()
+
+    def save(self):
+        """ Save the manifest file. """
+        records = self._own if self.is_shard else self._index
+        write_json(self._path, {'version': 1, 'packs': list(records.values())})
@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2024 Nortxort
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import asyncio
+import bisect
+import logging
+import sys
+import time
+from pathlib import Path
+
+from file_handler import write_json
+
+
+log = logging.getLogger(__name__)
+
+# upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+class Histogram:
+    """
+    Histogram with fixed buckets, like a Prometheus histogram.
+    """
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        """
+        Initialize the Histogram class.
+
+        :param buckets: sorted upper bounds of the buckets.
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        """ Add a value to the histogram. """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate a quantile, as the upper bound of its bucket.
+
+        :param q: the quantile, between 0 and 1.
+        :return: the upper bound, or 0 without values.
+        """
+        if self.count == 0:
+            return 0.0
+
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total >= rank:
+                return bound
+
+        return float('inf')
+
+    def to_dict(self) -> dict:
+        return {
+            'buckets': dict(zip([str(b) for b in self.buckets] + ['+Inf'], self.counts)),
+            'count': self.count,
+            'sum': round(self.sum, 3)
+        }
+
+
+class StageMetrics:
+    """
+    Metrics of a stage of queue workers, e.g the parser or the downloader.
+    """
+    def __init__(self, name: str, unit: str = 'items'):
+        """
+        Initialize the StageMetrics class.
+
+        :param name: name of the stage.
+        :param unit: what the items of the stage are called.
+        """
+        self.name = name
+        self.unit = unit
+        self.queue = None
+        self.queued = 0
+        self.done = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.bytes = 0
+        self.expected_bytes = 0
+        self.worker_bytes = {}
+        self.latency = Histogram()
+
+    @property
+    def queue_size(self) -> int:
+        """ the amount of items in the queue. """
+        return 0 if self.queue is None else self.queue.qsize()
+
+    def add(self, nbytes: int = 0):
+        """
+        Count an item added to the stage.
+
+        :param nbytes: the expected size of the item, 0 if unknown.
+        """
+        self.queued += 1
+        self.expected_bytes += nbytes
+
+    def start(self):
+        """ Count an item a worker started on. """
+        self.in_flight += 1
+
+    def add_bytes(self, worker: int, nbytes: int):
+        """
+        Count bytes received by a worker.
+
+        :param worker: the worker number.
+        :param nbytes: the amount of bytes.
+        """
+        self.bytes += nbytes
+        self.worker_bytes[worker] = self.worker_bytes.get(worker, 0) + nbytes
+
+    def finish(self, latency: float, error: bool = False):
+        """
+        Count an item a worker finished, successful or not.
+
+        :param latency: seconds the item took.
+        :param error: True if the item failed.
+        """
+        self.in_flight -= 1
+        self.latency.observe(latency)
+        if error:
+            self.errors += 1
+        else:
+            self.done += 1
+
+
+class Metrics:
+    """
+    Metrics of a run, shown as a progress line, and exported
+    as json or Prometheus text.
+    """
+    def __init__(self, retry=None):
+        """
+        Initialize the Metrics class.
+
+        :param retry: RetryScheduler object, to count the retries of.
+        """
+        self.parser = StageMetrics('parser', 'pages')
+        self.download = StageMetrics('download', 'packs')
+        self._retry = retry
+        self._started = time.monotonic()
+        self._last = self._started
+        self._last_bytes = {}
+        self._rates = {}
+        self._worker_rates = {}
+
+    @property
+    def stages(self) -> tuple:
+        return self.parser, self.download
+
+    def update(self):
+        """ Update the byte rates, since the last update. """
+        now = time.monotonic()
+        elapsed = max(now - self._last, 1e-6)
+
+        for stage in self.stages:
+            last = self._last_bytes.get(stage.name, {})
+            self._rates[stage.name] = (stage.bytes - sum(last.values())) / elapsed
+            self._worker_rates[stage.name] = {
+                num: (nbytes - last.get(num, 0)) / elapsed
+                for num, nbytes in stage.worker_bytes.items()
+            }
+            self._last_bytes[stage.name] = dict(stage.worker_bytes)
+
+        self._last = now
+
+    def eta(self) -> float:
+        """
+        Estimated seconds until the downloads are done.
+
+        Uses the remaining bytes if the sizes are known, else the remaining
+        sample packs, at the average rate of the run so far.
+
+        :return: seconds, or -1 if unknown.
+        """
+        stage = self.download
+        elapsed = time.monotonic() - self._started
+        if stage.bytes > 0 and stage.expected_bytes > stage.bytes:
+            return (stage.expected_bytes - stage.bytes) / (stage.bytes / elapsed)
+
+        remaining = stage.queued - stage.done
+        if stage.done > 0 and remaining > 0:
+            return remaining / (stage.done / elapsed)
+
+        return -1
+
+    def snapshot(self) -> dict:
+        """ The metrics as a dictionary. """
+        data = {
+            'time': int(time.time()),
+            'elapsed': round(time.monotonic() - self._started, 1),
+            'retries': 0 if self._retry is None else self._retry.retries,
+            'eta': round(self.eta(), 1),
+            'stages': {}
+        }
+
+        for stage in self.stages:
+            data['stages'][stage.name] = {
+                'queued': stage.queued,
+                'done': stage.done,
+                'errors': stage.errors,
+                'queue_size': stage.queue_size,
+                'in_flight': stage.in_flight,
+                'bytes': stage.bytes,
+                'expected_bytes': stage.expected_bytes,
+                'bytes_per_second': round(self._rates.get(stage.name, 0.0)),
+                'worker_bytes_per_second': {
+                    str(num): round(rate)
+                    for num, rate in self._worker_rates.get(stage.name, {}).items()
+                },
+                'latency': stage.latency.to_dict()
+            }
+
+        return data
+
+    def progress_line(self) -> str:
+        """ A compact line with the progress of each stage. """
+        parts = []
+        for stage in self.stages:
+            part = (f'{stage.name} {stage.done}/{stage.queued} {stage.unit} '
+                    f'q={stage.queue_size} run={stage.in_flight} '
+                    f'p50={stage.latency.quantile(0.5):g}s')
+            if stage.bytes > 0:
+                part += f' {self._rates.get(stage.name, 0.0) / 1024 / 1024:.1f}MB/s'
+            parts.append(part)
+
+        line = ' | '.join(parts)
+        if self._retry is not None:
+            line += f' | retries {self._retry.retries}'
+
+        eta = self.eta()
+        if eta >= 0:
+            minutes, seconds = divmod(int(eta), 60)
+            line += f' | eta {minutes // 60}:{minutes % 60:02}:{seconds:02}'
+
+        return line
+
+    def prometheus(self) -> str:
+        """ The metrics in the Prometheus text format. """
+        lines = []
+
+        def metric(name: str, kind: str, samples: list):
+            lines.append(f'# TYPE sample_rip_{name} {kind}')
+            for labels, value in samples:
+                label = ','.join(f'{k}="{v}"' for k, v in labels.items())
+                label = f'{{{label}}}' if label else ''
+                lines.append(f'sample_rip_{name}{label} {value}')
+
+        stages = self.stages
+        metric('items_queued_total', 'counter', [({'stage': s.name}, s.queued) for s in stages])
+        metric('items_done_total', 'counter', [({'stage': s.name}, s.done) for s in stages])
+        metric('items_failed_total', 'counter', [({'stage': s.name}, s.errors) for s in stages])
+        metric('queue_size', 'gauge', [({'stage': s.name}, s.queue_size) for s in stages])
+        metric('in_flight', 'gauge', [({'stage': s.name}, s.in_flight) for s in stages])
+        metric('bytes_total', 'counter', [({'stage': s.name}, s.bytes) for s in stages])
+        metric('bytes_per_second', 'gauge',
+               [({'stage': s.name}, round(self._rates.get(s.name, 0.0))) for s in stages])
+        metric('worker_bytes_per_second', 'gauge',
+               [({'stage': s.name, 'worker': num}, round(rate))
+                for s in stages for num, rate in self._worker_rates.get(s.name, {}).items()])
+
+        lines.append('# TYPE sample_rip_latency_seconds histogram')
+        for s in stages:
+            total = 0
+            for bound, count in zip([str(b) for b in s.latency.buckets] + ['+Inf'], s.latency.counts):
+                total += count
+                lines.append(f'sample_rip_latency_seconds_bucket{{stage="{s.name}",le="{bound}"}} {total}')
+            lines.append(f'sample_rip_latency_seconds_sum{{stage="{s.name}"}} {s.latency.sum:.3f}')
+            lines.append(f'sample_rip_latency_seconds_count{{stage="{s.name}"}} {s.latency.count}')
+
+        metric('retries_total', 'counter', [({}, 0 if self._retry is None else self._retry.retries)])
+        metric('eta_seconds', 'gauge', [({}, round(self.eta(), 1))])
+
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path: Path):
+        """
+        Write the metrics to a file, as Prometheus text if the
+        file name ends with `.prom`, else as json.
+
+        :param path: path to the file.
+        """
+        path = Path(path)
+        if path.suffix == '.prom':
+            tmp = path.with_name(f'{path.name}.tmp')
+            tmp.write_text(self.prometheus(), encoding='utf-8')
+            tmp.replace(path)
+        else:
+            write_json(path, self.snapshot())
+
+    async def report(self, interval: float = 1.0, progress: bool = True, path: Path = None):
+        """
+        Update the metrics every interval, until cancelled.
+
+        :param interval: seconds between updates.
+        :param progress: show the progress line on stderr.
+        :param path: file to export the metrics to, or None.
+        """
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                self.update()
+
+                if progress:
+                    sys.stderr.write(f'\r{self.progress_line()}\033[K')
+                    sys.stderr.flush()
+
+                if path is not None:
+                    self._export(path)
+        finally:
+            if progress:
+                sys.stderr.write('\n')
+
+            if path is not None:
+                # the final metrics of the stage
+                self.update()
+                self._export(path)
+
+    def _export(self, path: Path):
+        try:
+            self.export(path)
+        except OSError as e:
+            log.error(f'failed to export metrics to {path}: {e}')
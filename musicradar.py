@@ -25,10 +25,14 @@ DEALINGS IN THE SOFTWARE.
 """
 import logging
 import asyncio
+import time
 
-from bs4 import BeautifulSoup
-from web import get
+from web import get, status_error, exception_error, ERROR_CONNECTION, ERROR_CLIENT, \
+     ERROR_UNEXPECTED
 from samplepack import SamplePack
+from extractor import get_backend
+from concurrency import WorkerPool, spawn_executor
+from retry import RetryScheduler
 
 
 log = logging.getLogger(__name__)
@@ -38,26 +42,58 @@ class MusicRadarParser:
     """
     MusicRadar sample pack parser.
     """
-    _INDEX_URL = ('https://www.musicradar.com/news/tech/'
+    # name of the Session pool for page requests
+    POOL = 'pages'
+
+    _BASE_URL = 'https://www.musicradar.com/'
+
+    _INDEX_URL = (f'{_BASE_URL}news/tech/'
                   'free-music-samples-royalty-free-loops-hits-and-multis-to-download-sampleradar')
 
-    def __init__(self, queue_size: int = 0, pages_num: int = 0):
+    def __init__(self, queue_size: int = 0, pages_num: int = 0, cache=None,
+                 crawl_state=None, on_sample_pack=None, backend: str = 'stream',
+                 processes: int = 0, controller=None, retry=None, metrics=None):
         """
         Initialize the MusicRadar parser.
 
         :param queue_size: Sets the maxsize of the queue
         :param pages_num: Number of sample page urls. 0 for all.
+        :param cache: ResponseCache object for page requests or None.
+        :param crawl_state: CrawlState object for incremental crawling or None.
+        Sample pages parsed on earlier runs are not requested again.
+        :param on_sample_pack: coroutine function called with
+        each SamplePack object, as soon as it is parsed.
+        :param backend: name of the extraction backend, `stream` or `bs4`.
+        :param processes: size of the process pool pages are parsed in.
+        0 to parse pages on the event loop.
+        :param controller: AdaptiveConcurrency object to adjust the
+        amount of workers with, or None for a fixed amount.
+        :param retry: RetryScheduler object for failed page requests,
+        None for a default RetryScheduler.
+        :param metrics: StageMetrics object to record the page requests in, or None.
         """
         self._main_queue = asyncio.Queue(maxsize=queue_size)
         self._pages_num = pages_num
-        self._sample_packs = []
+        self._cache = cache
+        self._crawl_state = crawl_state
+        self._on_sample_pack = on_sample_pack
+        self._extract_page_urls, self._extract_packs = get_backend(backend)
+        self._processes = processes
+        self._executor = None
+        self._controller = controller
+        self._retry = RetryScheduler() if retry is None else retry
+        self._metrics = metrics
+        if metrics is not None:
+            metrics.queue = self._main_queue
+        self._pool = None
+        self._parsed = 0
 
     @property
-    def sample_packs(self) -> list:
-        """ A list of SamplePack objects. """
-        return self._sample_packs
+    def parsed(self) -> int:
+        """ The amount of SamplePack objects parsed. """
+        return self._parsed
 
-    async def start(self, workers: int) -> list:
+    async def start(self, workers: int) -> int:
         """
         Start the MusicRadar parser.
 
@@ -67,88 +103,227 @@ class MusicRadarParser:
 
         NOTE: The amount of workers should not be too high.
         since this could cause the server to not respond,
-        resulting in hanging.
+        resulting in hanging. With a controller, workers is
+        only the initial amount of workers.
+
+        The SamplePack objects are not kept, use `on_sample_pack`
+        or `iter_sample_packs` to handle them as they are parsed.
 
         :param workers: The amount of queue workers
-        :return: A list of SamplePack objects
+        :return: The amount of SamplePack objects parsed.
         """
+        if self._processes > 0:
+            self._executor = spawn_executor(self._processes)
+
         # prepare workers to work on the queue
-        work_force = [asyncio.create_task(self._queue_worker(i))
-                      for i in range(workers)]
+        self._pool = WorkerPool(self._queue_worker, workers, self._controller)
+        self._pool.start()
 
-        # start producing sample page urls
-        await self._parse_sample_page_urls()
+        try:
+            # start producing sample page urls
+            await self._parse_sample_page_urls()
 
-        log.debug('calling queue.join()')
-        # wait for all workers to be done
-        await self._main_queue.join()
+            log.debug('calling queue.join()')
+            # wait for all workers to be done
+            await self._main_queue.join()
 
-        log.debug('cancelling workers')
-        # cancel workers.
-        for worker in work_force:
-            worker.cancel()
+        finally:
+            log.debug('cancelling workers')
+            # cancel workers.
+            self._pool.cancel()
 
-        # return a list of SamplePack objects
-        return self._sample_packs
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
 
-    async def _parse_sample_page_urls(self):
+        if self._cache is not None:
+            self._cache.save()
+            log.debug(f'cache hits: {self._cache.hits}, misses: {self._cache.misses}')
 
-        log.info('starting url parsing')
+        if self._crawl_state is not None:
+            self._crawl_state.save()
 
-        response = await get(self._INDEX_URL)
-        if response is not None:
+        return self._parsed
 
-            soup = BeautifulSoup(await response.text(), 'html.parser')
-            body = soup.find(attrs={'id': 'article-body'})
+    async def iter_sample_packs(self, workers: int):
+        """
+        Start the MusicRadar parser, and yield SamplePack objects as they are parsed.
 
-            p_tags = body.find_all('p')
-            if len(p_tags) > 8:
+        The parser waits for each SamplePack object to be taken,
+        so memory use does not grow with the amount of sample packs.
 
-                i = 0
-                for p in p_tags[9:-1]:
+        :param workers: The amount of queue workers
+        """
+        results = asyncio.Queue()
+        on_sample_pack = self._on_sample_pack
+
+        async def put(sp):
+            if on_sample_pack is not None:
+                await on_sample_pack(sp)
+
+            # wait for the sample pack to be taken
+            results.put_nowait(sp)
+            await results.join()
+
+        async def parse():
+            try:
+                await self.start(workers)
+            finally:
+                # None marks the end of the sample packs
+                results.put_nowait(None)
+
+        self._on_sample_pack = put
+        task = asyncio.create_task(parse())
+        try:
+            while (sp := await results.get()) is not None:
+                yield sp
+                results.task_done()
+
+            # raise any exception of the parser
+            await task
+        finally:
+            task.cancel()
+            self._on_sample_pack = on_sample_pack
 
-                    if self._pages_num > 0:
-                        if i == self._pages_num:
-                            break
+    async def _parse_sample_page_urls(self):
 
-                    p_a_tag = p.a
-                    if hasattr(p_a_tag, 'text'):
-                        url = p_a_tag['href']
-                        log.debug(f'parsed sample page url: {url}')
-                        if url.startswith('https://www.musicradar.com/'):
-                            await self._main_queue.put(url)
-                            i += 1
+        log.info('starting url parsing')
 
-    async def _queue_worker(self, num: int):
+        html = await self._fetch_index()
+        if html is not None:
+
+            try:
+                urls = await self._extract(self._extract_page_urls, html)
+            except Exception as e:
+                log.error(f'failed to extract the sample page urls: {e!r}', exc_info=True)
+                self._retry.add_dead_letter(self._INDEX_URL, ERROR_UNEXPECTED, repr(e))
+                return
+
+            if len(urls) == 0:
+                log.warning(f'no sample page urls found on {self._INDEX_URL}')
+
+            i = 0
+            for url in urls:
+
+                if self._pages_num > 0:
+                    if i == self._pages_num:
+                        break
+
+                log.debug(f'parsed sample page url: {url}')
+                if url.startswith(self._BASE_URL):
+                    if self._crawl_state is not None and self._crawl_state.is_fresh(url):
+                        log.debug(f'using sample packs from earlier parse of {url}')
+                        await self._add_sample_packs(self._crawl_state.sample_packs(url))
+                    else:
+                        if self._metrics is not None:
+                            self._metrics.add()
+                        await self._main_queue.put(url)
+                    i += 1
+
+    async def _fetch_index(self):
+        """
+        Get the index page, retrying like the sample pages.
 
+        :return: the html of the index page, or None if it failed.
+        """
         while True:
+            response = await get(self._INDEX_URL, cache=self._cache, pool=self.POOL)
+
+            headers, reason = None, ''
+            if response is None:
+                error = ERROR_CONNECTION
+            else:
+                error = status_error(response.status)
+                headers, reason = response.headers, f'status {response.status}'
+
+            if not error:
+                try:
+                    return await response.text()
+                except Exception as e:
+                    error, reason = exception_error(e), repr(e)
+            elif response is not None:
+                response.release()
+
+            if not await self._retry.wait(self._INDEX_URL, error, reason, headers):
+                return None
+
+    async def _queue_worker(self, num: int):
+
+        while self._pool.is_active(num):
             url = await self._main_queue.get()
             log.debug(f'worker-{num}, handling: {url}')
+            await self._retry.handle(self._main_queue, url, url, self._parse_sample_page(num, url))
+
+    async def _parse_sample_page(self, num: int, url: str):
+        """ Get and parse a sample page, and mark it done or failed. """
+        if self._metrics is not None:
+            self._metrics.start()
+
+        start = time.monotonic()
+        response = await get(url=url, cache=self._cache, pool=self.POOL, rua=True, timeout=10)
+
+        if response is None:
+            error = ERROR_CONNECTION
+        else:
+            error = status_error(response.status)
 
-            response = await get(url=url, rua=True, timeout=10)
+        latency = time.monotonic() - start
+        if self._controller is not None:
+            self._controller.record(latency=latency, error=error not in ('', ERROR_CLIENT))
+
+        if self._metrics is not None:
+            self._metrics.finish(latency, error != '')
+
+        if error:
+            headers, reason = None, ''
             if response is not None:
-                await self._parse_sample_pack_url(url, await response.text())
-                self._main_queue.task_done()
-            # implement fail queue?
+                headers, reason = response.headers, f'status {response.status}'
+                response.release()
+
+            self._retry.fail(self._main_queue, url, url, error, reason, headers)
+            return
+
+        html = await response.text()
+        if self._metrics is not None:
+            self._metrics.add_bytes(num, len(html))
+
+        await self._parse_sample_pack_url(url, html)
+        self._main_queue.task_done()
 
     async def _parse_sample_pack_url(self, url, response):
 
-        soup = BeautifulSoup(response, 'html.parser')
-        text_copy_class = soup.find(attrs={'class': 'text-copy bodyCopy auto'})
+        packs = await self._extract(self._extract_packs, response)
+
+        if packs is not None:
+            sample_packs = []
+
+            for pack_url, pack_title in packs:
+                log.debug(f'sample pack url: {pack_url}, title: {pack_title}')
+
+                sp = SamplePack(url, pack_url, pack_title)
+                sample_packs.append(sp)
 
-        if text_copy_class is not None:
-            p_tags = text_copy_class.find_all('p')
+            await self._add_sample_packs(sample_packs)
 
-            for p in p_tags:
+            if self._crawl_state is not None and len(sample_packs) > 0:
+                self._crawl_state.update(url, sample_packs)
 
-                p_a_tag = p.a
-                if p_a_tag is not None:
+    async def _extract(self, func, html: str):
+        """
+        Run an extraction function, in the process pool if there is one.
+
+        The extraction functions return plain lists and tuples,
+        so the results are cheap to send back from the pool.
+        """
+        if self._executor is None:
+            return func(html)
 
-                    if p_a_tag['href'].endswith('.zip'):
-                        pack_url = p_a_tag['href']
-                        pack_title = p_a_tag.text
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, html)
 
-                        log.debug(f'sample pack url: {pack_url}, title: {pack_title}')
+    async def _add_sample_packs(self, sample_packs: list):
+        self._parsed += len(sample_packs)
 
-                        sp = SamplePack(url, pack_url, pack_title)
-                        self._sample_packs.append(sp)
+        if self._on_sample_pack is not None:
+            for sp in sample_packs:
+                await self._on_sample_pack(sp)
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2024 Nortxort
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import asyncio
+import logging
+from functools import partial
+
+from web import head, agent
+from concurrency import WorkerPool
+
+
+log = logging.getLogger(__name__)
+
+# statuses of urls that will not be there on a retry
+DEAD_STATUSES = (404, 410)
+
+
+class Probe:
+    """
+    Pre-flight HEAD requests for sample packs.
+
+    Fills in the content length, ETag and Last-Modified of each sample
+    pack, and finds the dead links, without downloading anything.
+    """
+    def __init__(self, workers: int = 16, pool: str = None):
+        """
+        Initialize the Probe class.
+
+        :param workers: the amount of HEAD requests at the same time.
+        :param pool: name of the Session pool to make the requests with.
+        """
+        self._workers = workers
+        self._pool_name = pool
+        self._main_queue = asyncio.Queue()
+        self._pool = None
+        self.dead = []
+        self.failed = 0
+        self.total_bytes = 0
+        self.unknown = 0
+
+    async def start(self, sample_packs: list) -> list:
+        """
+        Probe the sample packs.
+
+        Sample packs that could not be probed are kept, with a content
+        length of 0. They are counted in `failed`.
+
+        :param sample_packs: list of SamplePack objects.
+        :return: list of SamplePack objects that are not dead links.
+        """
+        for pack in sample_packs:
+            self._main_queue.put_nowait(pack)
+
+        self._pool = WorkerPool(self._queue_worker, self._workers)
+        self._pool.start()
+
+        try:
+            await self._main_queue.join()
+        finally:
+            self._pool.cancel()
+
+        dead = {id(pack) for pack in self.dead}
+        live = [pack for pack in sample_packs if id(pack) not in dead]
+
+        self.total_bytes = sum(pack.content_length for pack in live)
+        self.unknown = sum(1 for pack in live if pack.content_length == 0)
+
+        return live
+
+    async def stream(self, sample_packs):
+        """
+        Probe the sample packs as they come in, e.g from the parser.
+
+        A sample pack is yielded as soon as it is probed, so the order
+        can differ from the order they came in. Dead links are not yielded.
+
+        :param sample_packs: async iterable of SamplePack objects.
+        :return: async generator of SamplePack objects.
+        """
+        probed = asyncio.Queue()
+        self._pool = WorkerPool(partial(self._queue_worker, probed=probed), self._workers)
+        self._pool.start()
+
+        async def feed():
+            try:
+                async for pack in sample_packs:
+                    await self._main_queue.put(pack)
+                await self._main_queue.join()
+            finally:
+                # also when the sample packs raised, so the loop below ends
+                await probed.put(None)
+
+        feeder = asyncio.create_task(feed())
+        try:
+            while True:
+                pack = await probed.get()
+                if pack is None:
+                    break
+
+                self.total_bytes += pack.content_length
+                self.unknown += pack.content_length == 0
+                yield pack
+
+            # raise the exception of the sample packs, if any
+            await feeder
+        finally:
+            feeder.cancel()
+            self._pool.cancel()
+
+    async def _queue_worker(self, num: int, probed: asyncio.Queue = None):
+
+        while self._pool.is_active(num):
+            pack = await self._main_queue.get()
+            try:
+                if await self._probe(pack) and probed is not None:
+                    await probed.put(pack)
+            finally:
+                self._main_queue.task_done()
+
+    async def _probe(self, pack) -> bool:
+        # False if the sample pack is a dead link
+        response = await head(pack.url, pool=self._pool_name, allow_redirects=True,
+                              headers=self._headers())
+        if response is None:
+            self.failed += 1
+            return True
+
+        try:
+            if response.status in DEAD_STATUSES:
+                log.warning(f'dead link {pack.url}, status {response.status}')
+                self.dead.append(pack)
+                return False
+
+            if response.status >= 400:
+                log.debug(f'probe of {pack.url} failed with status {response.status}')
+                self.failed += 1
+                return True
+
+            cl = response.headers.get('Content-Length', '')
+            pack.content_length = int(cl) if cl.isdigit() else 0
+            pack.etag = response.headers.get('ETag', '')
+            pack.last_modified = response.headers.get('Last-Modified', '')
+        finally:
+            response.release()
+
+        return True
+
+    @staticmethod
+    def _headers() -> dict:
+        return {
+            'Accept': '*/*',
+            # the content length of the file, not of an encoding of it
+            'Accept-Encoding': 'identity',
+            'User-Agent': agent.random_agent()
+        }
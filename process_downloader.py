@@ -0,0 +1,391 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2024 Nortxort
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import queue
+from pathlib import Path
+
+from concurrency import AdaptiveConcurrency
+from downloader import Downloader
+from retry import RetryScheduler
+from samplepack import SamplePack
+from scheduler import PackQueue, FIFO
+from web import Session, DOWNLOAD_PROFILE, RateLimiter
+
+
+log = logging.getLogger(__name__)
+
+# error class of the sample packs lost with a download process
+ERROR_PROCESS = 'process'
+
+# seconds between the metrics sent by a download process
+REPORT_INTERVAL = 0.25
+
+# seconds to wait on a multiprocessing queue, before checking the processes
+_POLL_TIMEOUT = 0.5
+
+# messages sent by the download processes to the parent
+_TAKEN = 'taken'
+_DOWNLOADED = 'downloaded'
+_METRICS = 'metrics'
+_EXIT = 'exit'
+
+
+class _ManifestProxy:
+    """ Sends the records of a download process to the manifest of the parent. """
+    def __init__(self, results, index: int):
+        self._results = results
+        self._index = index
+
+    def update(self, pack, etag: str = '', last_modified: str = '', checksum: str = ''):
+        self._results.put((_DOWNLOADED, self._index, pack.to_tuple(), etag, last_modified, checksum))
+
+
+class _MetricsBuffer:
+    """
+    Collects the metrics and failures of a download process,
+    until they are sent to the parent.
+    """
+    def __init__(self, retry: RetryScheduler):
+        self.queue = None
+        self._retry = retry
+        self._started = 0
+        self._worker_bytes = {}
+        self._finished = []
+        self._retries = 0
+        self._dead_letters = 0
+
+    def add(self, nbytes: int = 0):
+        # the parent counted the sample pack when it was queued
+        pass
+
+    def start(self):
+        self._started += 1
+
+    def add_bytes(self, worker: int, nbytes: int):
+        self._worker_bytes[worker] = self._worker_bytes.get(worker, 0) + nbytes
+
+    def finish(self, latency: float, error: bool = False):
+        self._finished.append((latency, error))
+
+    def flush(self) -> tuple:
+        """ The metrics since the last flush. """
+        dead_letters = self._retry.dead_letters[self._dead_letters:]
+        message = (self._started, self._worker_bytes, self._finished,
+                   self._retry.retries - self._retries, dead_letters)
+
+        self._started = 0
+        self._worker_bytes = {}
+        self._finished = []
+        self._retries = self._retry.retries
+        self._dead_letters += len(dead_letters)
+        return message
+
+
+def _get(q):
+    # a timeout, so a blocked thread does not keep the process alive
+    try:
+        return True, q.get(timeout=_POLL_TIMEOUT)
+    except queue.Empty:
+        return False, None
+
+
+def _process_main(index: int, path: Path, workers: int, options: dict, tasks, results):
+    logging.basicConfig(
+        format='%(asctime)s:%(levelname)s:%(processName)s:%(name)s.%(funcName)s(): %(message)s',
+        level=options.pop('log_level')
+    )
+    try:
+        asyncio.run(_run_process(index, path, workers, options, tasks, results))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _run_process(index: int, path: Path, workers: int, options: dict, tasks, results):
+    """ Download the sample packs taken from the tasks queue, until None is taken. """
+    controller = options.pop('controller')
+    max_workers = workers if controller is None else max(workers, controller.maximum)
+    Session.create_pool(Downloader.POOL, DOWNLOAD_PROFILE,
+                        limit_per_host=max_workers + options['host_segments'])
+
+    retry = RetryScheduler()
+    metrics = _MetricsBuffer(retry)
+    limiter = RateLimiter(options.pop('rate'), options.pop('host_rate'))
+
+    # a short queue, so the sample packs waiting are left to idle processes
+    dl = Downloader(path, queue_size=workers, retry=retry,
+                    manifest=_ManifestProxy(results, index),
+                    controller=controller, limiter=limiter,
+                    metrics=metrics, **options)
+
+    async def report():
+        while True:
+            await asyncio.sleep(REPORT_INTERVAL)
+            results.put((_METRICS, index, *metrics.flush()))
+
+    dl.start_workers(workers)
+    reporter = asyncio.create_task(report())
+    try:
+        while True:
+            ok, values = await asyncio.to_thread(_get, tasks)
+            if not ok:
+                continue
+            if values is None:
+                break
+
+            pack = SamplePack.from_tuple(values)
+            results.put((_TAKEN, index, pack.url))
+            await dl.put(pack)
+
+        await dl.stop()
+    finally:
+        reporter.cancel()
+        await Session.close()
+        results.put((_METRICS, index, *metrics.flush()))
+        results.put((_EXIT, index))
+
+
+class ProcessDownloader:
+    """
+    Downloads sample packs in several processes, each running
+    a Downloader with its own event loop and connection pool.
+
+    Sample packs are added with `put` to a scheduled queue in this process,
+    and handed out to the download processes through a multiprocessing
+    queue. The processes send back the downloaded sample packs, which are
+    recorded in the manifest here, along with their metrics and failures.
+    """
+    # name of the Session pool for downloads
+    POOL = Downloader.POOL
+
+    def __init__(self, path, processes: int = 2, queue_size: int = 10,
+                 manifest=None, retry=None, on_download=None, policy: str = FIFO,
+                 metrics=None, rate: int = 0, host_rate: int = 0, host_segments: int = 4,
+                 controller: AdaptiveConcurrency = None,
+                 log_level: int = logging.WARNING, **options):
+        """
+        Initialize the ProcessDownloader class.
+
+        :param path: path to the download directory.
+        :param processes: the amount of download processes.
+        :param queue_size: max size of the download queue.
+        :param manifest: Manifest object to record completed downloads in.
+        :param retry: RetryScheduler object to add the failed downloads to,
+        None for a default RetryScheduler. Retries are done by the processes.
+        :param on_download: coroutine function called with
+        each SamplePack object, as soon as it is downloaded.
+        :param policy: scheduling policy of the download queue, see scheduler.POLICIES.
+        :param metrics: StageMetrics object to record the downloads in, or None.
+        :param rate: max download bandwidth of all processes, in bytes per second.
+        :param host_rate: max download bandwidth per host of all processes, in bytes per second.
+        :param host_segments: max extra segment connections per host of all processes.
+        :param controller: AdaptiveConcurrency object, each process adjusts
+        its workers with a copy of it, or None for a fixed amount.
+        :param log_level: the logging level of the processes.
+        :param options: keyword arguments of the Downloader in each process,
+        e.g segment_threshold or chunk_size.
+        """
+        self._path = Path(path)
+        self._processes = processes
+        self._manifest = manifest
+        self._retry = RetryScheduler() if retry is None else retry
+        self._on_download = on_download
+        self._main_queue = PackQueue(queue_size, policy)
+        self._metrics = metrics
+        if metrics is not None:
+            metrics.queue = self._main_queue
+
+        # the bandwidth and segment connections are split evenly between the
+        # processes. a process can not use the share of an idle process.
+        self._options = dict(options, log_level=log_level, controller=controller,
+                             rate=self._split(rate), host_rate=self._split(host_rate),
+                             host_segments=self._split(host_segments))
+
+        self._context = multiprocessing.get_context('spawn')
+        self._tasks = None
+        self._results = None
+        self._workers = []
+        self._feeder = None
+        self._reader = None
+        # sample packs taken by each process, by url
+        self._taken = {}
+        self._downloaded = 0
+        self._downloaded_bytes = 0
+
+    @property
+    def downloaded(self) -> int:
+        """ The amount of sample packs downloaded. """
+        return self._downloaded
+
+    @property
+    def downloaded_bytes(self) -> int:
+        """ The amount of bytes downloaded. """
+        return self._downloaded_bytes
+
+    def start_workers(self, workers: int):
+        """
+        Start the download processes.
+
+        Sample packs can then be added with `put`, while
+        the processes are downloading. Call `stop` when done.
+
+        :param workers: The amount of queue workers in each process.
+        """
+        # a queue as short as the amount of processes, so the
+        # order of the sample packs is decided by the scheduled queue.
+        self._tasks = self._context.Queue(maxsize=self._processes)
+        self._results = self._context.Queue()
+
+        for index in range(self._processes):
+            process = self._context.Process(
+                target=_process_main, name=f'download-{index}', daemon=True,
+                args=(index, self._path, workers, dict(self._options), self._tasks, self._results)
+            )
+            process.start()
+            self._workers.append(process)
+            self._taken[index] = {}
+
+        self._reader = asyncio.create_task(self._read_results())
+        self._feeder = asyncio.create_task(self._feed())
+
+    async def put(self, pack):
+        """
+        Add a sample pack to the download queue.
+
+        Waits for a free slot if the queue is full.
+
+        :param pack: SamplePack object.
+        """
+        log.debug(f'adding {pack.url} to download queue')
+        if self._metrics is not None:
+            self._metrics.add(pack.content_length)
+        await self._main_queue.put(pack)
+
+    async def stop(self) -> int:
+        """
+        Wait for the download queue to be empty, and for
+        the processes to finish their downloads.
+
+        :return: The amount of sample packs downloaded.
+        """
+        try:
+            await self._main_queue.join()
+
+            for _ in self._workers:
+                await asyncio.to_thread(self._put_task, None)
+
+            await self._reader
+        finally:
+            self._feeder.cancel()
+            self._reader.cancel()
+            for process in self._workers:
+                await asyncio.to_thread(process.join, _POLL_TIMEOUT)
+                if process.is_alive():
+                    process.terminate()
+
+        return self._downloaded
+
+    def _split(self, value: int) -> int:
+        # at least 1 per process, since 0 means no limit
+        return max(1, value // self._processes) if value > 0 else 0
+
+    def _put_task(self, values) -> bool:
+        while any(process.is_alive() for process in self._workers):
+            try:
+                self._tasks.put(values, timeout=_POLL_TIMEOUT)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    async def _feed(self):
+        while True:
+            pack = await self._main_queue.get()
+            if not await asyncio.to_thread(self._put_task, pack.to_tuple()):
+                self._retry.add_dead_letter(pack.url, ERROR_PROCESS, 'no download process is running')
+            self._main_queue.task_done()
+
+    async def _read_results(self):
+        running = set(range(len(self._workers)))
+
+        while running:
+            ok, message = await asyncio.to_thread(_get, self._results)
+            if not ok:
+                for index in list(running):
+                    if not self._workers[index].is_alive():
+                        running.discard(index)
+                        self._lost(index)
+                continue
+
+            kind, index, *values = message
+            if kind == _TAKEN:
+                self._taken[index][values[0]] = True
+            elif kind == _DOWNLOADED:
+                await self._on_downloaded(index, *values)
+            elif kind == _METRICS:
+                self._update(index, *values)
+            elif kind == _EXIT:
+                running.discard(index)
+
+    async def _on_downloaded(self, index: int, values: tuple, etag: str,
+                             last_modified: str, checksum: str):
+        pack = SamplePack.from_tuple(values)
+        self._taken[index].pop(pack.url, None)
+
+        if self._manifest is not None:
+            self._manifest.update(pack, etag=etag, last_modified=last_modified, checksum=checksum)
+
+        self._downloaded += 1
+        self._downloaded_bytes += pack.size
+
+        if self._on_download is not None:
+            await self._on_download(pack)
+
+    def _update(self, index: int, started: int, worker_bytes: dict, finished: list,
+                retries: int, dead_letters: list):
+        if self._metrics is not None:
+            for _ in range(started):
+                self._metrics.start()
+            for num, nbytes in worker_bytes.items():
+                self._metrics.add_bytes(f'{index}-{num}', nbytes)
+            for latency, error in finished:
+                self._metrics.finish(latency, error)
+
+        self._retry.retries += retries
+        for dead in dead_letters:
+            self._taken[index].pop(dead['key'], None)
+            self._retry.add_dead_letter(dead['key'], dead['error'], dead['reason'], dead['attempts'])
+
+    def _lost(self, index: int):
+        exitcode = self._workers[index].exitcode
+        log.error(f'download process {index} exited with code {exitcode}')
+
+        for url in self._taken.pop(index, {}):
+            self._retry.add_dead_letter(url, ERROR_PROCESS, f'download process {index} exited '
+                                                            f'with code {exitcode}')
+        self._taken[index] = {}
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2024 Nortxort
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+
+from file_handler import write_json
+from web import ERROR_CONNECTION, ERROR_TIMEOUT, ERROR_THROTTLED, \
+     ERROR_SERVER, ERROR_CLIENT, ERROR_INCOMPLETE, ERROR_UNEXPECTED, exception_error
+
+
+log = logging.getLogger(__name__)
+
+# times an item is retried, by error class
+DEFAULT_BUDGETS = {
+    ERROR_CONNECTION: 5,
+    ERROR_TIMEOUT: 5,
+    ERROR_THROTTLED: 8,
+    ERROR_SERVER: 5,
+    ERROR_INCOMPLETE: 3,
+    ERROR_UNEXPECTED: 1,
+    ERROR_CLIENT: 0
+}
+
+
+class RetryScheduler:
+    """
+    Puts failed queue items back on their queue after a delay.
+
+    The delay grows exponentially with the attempts, with jitter.
+    Items that used up the retry budget of their error class are
+    added to the dead letters.
+
+    A retried item is only marked done on its queue after it was put
+    back, so `queue.join()` keeps waiting for it, without blocking
+    the worker.
+    """
+    FILE_NAME = '.sample-rip-failed.json'
+
+    def __init__(self, budgets: dict = None, base_delay: float = 1.0,
+                 max_delay: float = 300.0):
+        """
+        Initialize the RetryScheduler class.
+
+        :param budgets: times to retry an item, by error class.
+        Error classes not in budgets are not retried.
+        :param base_delay: delay in seconds before the first retry.
+        :param max_delay: max delay in seconds before a retry.
+        """
+        self._budgets = DEFAULT_BUDGETS if budgets is None else budgets
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._attempts = {}
+        self._tasks = set()
+        self.retries = 0
+        self.dead_letters = []
+
+    @property
+    def pending(self) -> int:
+        """ the amount of items waiting to be retried. """
+        return len(self._tasks)
+
+    def fail(self, queue: asyncio.Queue, item, key: str, error: str,
+             reason: str = '', headers=None) -> bool:
+        """
+        Handle a failed queue item, instead of calling `queue.task_done()`.
+
+        :param queue: the queue the item was taken from.
+        :param item: the queue item.
+        :param key: key of the item, e.g the url.
+        :param error: the error class, see web.ERROR_*.
+        :param reason: description of the error.
+        :param headers: response headers, used for Retry-After.
+        :return: True if the item will be retried, False if it is dead.
+        """
+        delay = self._next_delay(key, error, reason, headers)
+        if delay is None:
+            queue.task_done()
+            return False
+
+        task = asyncio.create_task(self._retry(queue, item, delay))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def handle(self, queue: asyncio.Queue, item, key: str, work) -> bool:
+        """
+        Handle a queue item, and fail it if handling raises an exception.
+
+        Any failure must end in `queue.task_done()` or a retry,
+        or `queue.join()` never returns.
+
+        :param queue: the queue the item was taken from.
+        :param item: the queue item.
+        :param key: key of the item, e.g the url.
+        :param work: coroutine handling the item, which calls
+        `queue.task_done()` or `fail` itself.
+        :return: True if the item was handled, False if it failed.
+        """
+        try:
+            await work
+        except Exception as e:
+            log.error(f'handling {key} failed: {e!r}', exc_info=True)
+            self.fail(queue, item, key, exception_error(e), repr(e))
+            return False
+
+        return True
+
+    async def wait(self, key: str, error: str, reason: str = '', headers=None) -> bool:
+        """
+        Handle a failed item that is not on a queue,
+        by waiting until it can be retried.
+
+        :param key: key of the item, e.g the url.
+        :param error: the error class, see web.ERROR_*.
+        :param reason: description of the error.
+        :param headers: response headers, used for Retry-After.
+        :return: True if the item should be retried, False if it is dead.
+        """
+        delay = self._next_delay(key, error, reason, headers)
+        if delay is None:
+            return False
+
+        await asyncio.sleep(delay)
+        return True
+
+    def _next_delay(self, key: str, error: str, reason: str, headers):
+        # the delay before the next attempt, or None if the item is dead
+        attempt = self._attempts.get(key, 0) + 1
+        self._attempts[key] = attempt
+
+        if attempt > self._budgets.get(error, 0):
+            log.error(f'giving up on {key} after {attempt} attempts: {error} {reason}'.rstrip())
+            self.add_dead_letter(key, error, reason, attempt)
+            return None
+
+        delay = self.delay(attempt, headers)
+        log.debug(f'retrying {key} in {delay:.1f}s, attempt {attempt}: {error} {reason}'.rstrip())
+
+        self.retries += 1
+        return delay
+
+    def add_dead_letter(self, key: str, error: str, reason: str = '', attempts: int = 1):
+        """
+        Add an item that failed outside of a queue to the dead letters.
+
+        :param key: key of the item, e.g the url.
+        :param error: the error class, see web.ERROR_*.
+        :param reason: description of the error.
+        :param attempts: the amount of attempts.
+        """
+        self.dead_letters.append({
+            'key': key,
+            'error': error,
+            'reason': reason,
+            'attempts': attempts,
+            'time': int(time.time())
+        })
+
+    def delay(self, attempt: int, headers=None) -> float:
+        """
+        The delay before a retry.
+
+        :param attempt: the attempt that failed, starting at 1.
+        :param headers: response headers, used for Retry-After.
+        :return: delay in seconds.
+        """
+        delay = min(self._max_delay, self._base_delay * 2 ** (attempt - 1))
+        # equal jitter, half fixed and half random
+        delay = delay / 2 + random.uniform(0, delay / 2)
+
+        if headers is not None:
+            delay = max(delay, min(self._max_delay, retry_after(headers.get('Retry-After'))))
+
+        return delay
+
+    def report(self) -> str:
+        """ A report of the dead letters. """
+        lines = [f'{len(self.dead_letters)} failed after {self.retries} retries']
+        for dead in self.dead_letters:
+            reason = f' ({dead["reason"]})' if dead['reason'] else ''
+            lines.append(f'{dead["key"]}: {dead["error"]}{reason}, {dead["attempts"]} attempts')
+
+        return '\n'.join(lines)
+
+    def save(self, path: str, file_name: str = FILE_NAME) -> Path:
+        """
+        Save the dead letters as json, in the root directory.
+
+        :param path: path to the root directory.
+        :param file_name: name of the file.
+        :return: path to the file.
+        """
+        path = Path(path).joinpath(file_name)
+        write_json(path, {'version': 1, 'failed': self.dead_letters})
+        return path
+
+    @staticmethod
+    async def _retry(queue: asyncio.Queue, item, delay: float):
+        await asyncio.sleep(delay)
+        await queue.put(item)
+        queue.task_done()
+
+
+def retry_after(value) -> float:
+    """
+    Parse a Retry-After header.
+
+    :param value: Retry-After header value, seconds or a http date.
+    :return: seconds to wait, 0 if unknown.
+    """
+    if not value:
+        return 0
+
+    if value.isdigit():
+        return int(value)
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return 0
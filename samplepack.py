@@ -29,13 +29,51 @@ class SamplePack:
     """
     Sample pack data class.
     """
-    def __init__(self, page_url: str, url: str, title: str):
+    __slots__ = ('_page_url', '_url', '_title', '_name_start',
+                 '_size', '_file_path', '_content_length', '_etag', '_last_modified')
+
+    def __init__(self, page_url: str, url: str, title: str,
+                 size: int = 0, path: str = '', content_length: int = 0,
+                 etag: str = '', last_modified: str = ''):
         self._page_url = page_url
         self._url = url
         self._title = title
-        self._size: int = 0
-        self._file_path: str = ''
-        self._content_length: int = 0
+        # the file name is sliced from the url when needed, instead of keeping
+        # two more strings. a small int offset takes no memory of its own.
+        self._name_start = url.rfind('/') + 1
+        self._size = size
+        self._file_path = path
+        self._content_length = content_length
+        self._etag = etag
+        self._last_modified = last_modified
+
+    @classmethod
+    def from_tuple(cls, values):
+        """
+        Create a SamplePack object from the values of `to_tuple`.
+
+        A list works too, so values loaded from JSON can be used as is.
+
+        :param values: tuple or list of the sample pack values.
+        :return: SamplePack object.
+        """
+        return cls(*values)
+
+    def to_tuple(self) -> tuple:
+        """
+        The values of the sample pack, in the order of the constructor.
+
+        The path is a string, so the tuple can be saved as JSON.
+
+        :return: tuple of page_url, url, title, size, path, content_length,
+        etag and last_modified.
+        """
+        return (self._page_url, self._url, self._title, self._size,
+                str(self._file_path), self._content_length, self._etag, self._last_modified)
+
+    def __reduce__(self):
+        # pickle as the constructor values, the derived fields are not sent
+        return self.__class__, self.to_tuple()
 
     @property
     def page_url(self) -> str:
@@ -55,7 +93,14 @@ class SamplePack:
     @property
     def file_name(self) -> str:
         """ name of the sample pack(zip file name) """
-        return self._url.split('/')[-1]
+        return self._url[self._name_start:]
+
+    @property
+    def key(self) -> str:
+        """ name of the sample pack without the zip extension. """
+        if self._url.endswith('.zip'):
+            return self._url[self._name_start:-4]
+        return self._url[self._name_start:]
 
     @property
     def size(self) -> int:
@@ -72,6 +117,16 @@ class SamplePack:
         """ content length of file. """
         return self._content_length
 
+    @property
+    def etag(self) -> str:
+        """ ETag header of the sample pack, if known. """
+        return self._etag
+
+    @property
+    def last_modified(self) -> str:
+        """ Last-Modified header of the sample pack, if known. """
+        return self._last_modified
+
     @size.setter
     def size(self, value):
         self._size = value
@@ -84,12 +139,23 @@ class SamplePack:
     def content_length(self, value):
         self._content_length = value
 
+    @etag.setter
+    def etag(self, value):
+        self._etag = value
+
+    @last_modified.setter
+    def last_modified(self, value):
+        self._last_modified = value
+
     def __repr__(self):
         return (f'<{__class__.__name__} '
                 f'page_url={self.page_url}, '
                 f'url={self.url}, '
                 f'title={self.title}, '
                 f'file_name={self.file_name}, '
+                f'key={self.key}, '
                 f'size={self.size}, '
                 f'path={self.path}, '
-                f'content_length={self.content_length}>')
+                f'content_length={self.content_length}, '
+                f'etag={self.etag}, '
+                f'last_modified={self.last_modified}>')
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2024 Nortxort
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+
+
+log = logging.getLogger(__name__)
+
+# download the sample packs in the order they were found
+FIFO = 'fifo'
+# download the largest sample packs first, so the last ones are short
+LARGEST_FIRST = 'largest'
+# download the smallest sample packs first, for quick wins
+SMALLEST_FIRST = 'smallest'
+# take turns between the sample pages
+INTERLEAVE = 'interleave'
+
+POLICIES = (FIFO, LARGEST_FIRST, SMALLEST_FIRST, INTERLEAVE)
+
+
+class Schedule:
+    """
+    Priority of sample packs by a scheduling policy.
+
+    The size of a sample pack is its content length, known from a probe
+    or an earlier download. Sample packs of unknown size are scheduled
+    after the sample packs of known size. Equal priorities keep the
+    order the sample packs were added in.
+    """
+    def __init__(self, policy: str = FIFO):
+        """
+        Initialize the Schedule class.
+
+        :param policy: the scheduling policy, one of POLICIES.
+        """
+        if policy not in POLICIES:
+            raise ValueError(f'unknown scheduling policy {policy}, expected one of {POLICIES}')
+
+        self.policy = policy
+        self._pages = {}
+        self._count = itertools.count()
+
+    def priority(self, pack) -> tuple:
+        """
+        The priority of a sample pack, lowest first.
+
+        :param pack: SamplePack object.
+        :return: tuple to sort on.
+        """
+        size = pack.content_length
+        if self.policy == LARGEST_FIRST:
+            key = (size == 0, -size)
+        elif self.policy == SMALLEST_FIRST:
+            key = (size == 0, size)
+        elif self.policy == INTERLEAVE:
+            turn = self._pages.get(pack.page_url, 0)
+            self._pages[pack.page_url] = turn + 1
+            key = (turn,)
+        else:
+            key = ()
+
+        return key + (next(self._count),)
+
+    def order(self, packs: list) -> list:
+        """
+        Sort sample packs by priority.
+
+        :param packs: list of SamplePack objects.
+        :return: new list of SamplePack objects, in the order to download them.
+        """
+        return sorted(packs, key=self.priority)
+
+
+class PackQueue(asyncio.Queue):
+    """
+    Queue of sample packs, that gets the sample pack with the
+    highest priority by a scheduling policy first.
+
+    Only the sample packs in the queue are ordered, so with a bounded
+    queue the order is best in the size of the queue.
+    """
+    def __init__(self, maxsize: int = 0, policy: str = FIFO):
+        self._schedule = Schedule(policy)
+        super().__init__(maxsize)
+
+    @property
+    def policy(self) -> str:
+        """ the scheduling policy. """
+        return self._schedule.policy
+
+    def _init(self, maxsize):
+        self._queue = []
+
+    def _put(self, item):
+        heapq.heappush(self._queue, (self._schedule.priority(item), item))
+
+    def _get(self):
+        return heapq.heappop(self._queue)[1]
@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2024 Nortxort
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import os
+import time
+import bisect
+import socket
+import asyncio
+import hashlib
+import logging
+from pathlib import Path
+from contextlib import asynccontextmanager, suppress
+
+
+log = logging.getLogger(__name__)
+
+
+def _hash(value: str) -> int:
+    # the built-in hash() is salted per process, so it can not be shared by hosts
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def shard_file_name(file_name: str, shard: str) -> str:
+    """
+    The name of a file written by a single shard.
+
+    e.g `.sample-rip.json` becomes `.sample-rip.shard-1-of-4.json`
+
+    :param file_name: the file name.
+    :param shard: the shard name.
+    :return: the file name of the shard.
+    """
+    path = Path(file_name)
+    return f'{path.stem}.shard-{shard}{path.suffix}'
+
+
+class HashRing:
+    """
+    Consistent hash ring, mapping keys to shards.
+
+    Every shard is placed on the ring a number of times, and a key belongs
+    to the first shard after it on the ring. When a shard is added or
+    removed, only the keys next to its places move to another shard.
+    """
+    def __init__(self, shards: int, replicas: int = 128):
+        """
+        Initialize the HashRing class.
+
+        :param shards: the amount of shards.
+        :param replicas: the amount of places of each shard on the ring.
+        """
+        if shards < 1:
+            raise ValueError(f'shards must be at least 1, not {shards}')
+
+        points = sorted((_hash(f'shard-{shard}-{replica}'), shard)
+                        for shard in range(shards) for replica in range(replicas))
+
+        self._shards = shards
+        self._hashes = [h for h, _ in points]
+        self._owners = [shard for _, shard in points]
+
+    @property
+    def shards(self) -> int:
+        return self._shards
+
+    def shard(self, key: str) -> int:
+        """
+        The shard a key belongs to.
+
+        :param key: the key, e.g a sample pack file name.
+        :return: the shard index.
+        """
+        i = bisect.bisect(self._hashes, _hash(key))
+        return self._owners[i % len(self._owners)]
+
+
+class Leases:
+    """
+    File based leases in a directory shared by the shards.
+
+    A lease is a file created exclusively, containing the owner.
+    Held leases are touched while running, and a lease that was not
+    touched for `timeout` seconds can be taken over by another owner,
+    e.g when a shard was stopped or removed.
+    """
+    DIR_NAME = '.sample-rip-leases'
+
+    def __init__(self, path: str, owner: str, timeout: int = 600):
+        """
+        Initialize the Leases class.
+
+        :param path: path to the lease directory.
+        :param owner: name of the owner, unique for every shard.
+        :param timeout: seconds after which a lease that was not touched is stale.
+        """
+        self._path = Path(path)
+        self._owner = owner
+        self._timeout = timeout
+        self._held = set()
+        self._task = None
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @property
+    def held(self) -> int:
+        return len(self._held)
+
+    @staticmethod
+    def owner_name(shard: str) -> str:
+        """ The owner name of a shard on this host. """
+        return f'{socket.gethostname()}/shard-{shard}'
+
+    def _lease(self, key: str) -> Path:
+        return self._path.joinpath(f'{key}.lease')
+
+    def _read_owner(self, lease: Path) -> str:
+        try:
+            return lease.read_text(encoding='utf-8')
+        except OSError:
+            return ''
+
+    def _is_stale(self, lease: Path) -> bool:
+        try:
+            return time.time() - lease.stat().st_mtime > self._timeout
+        except FileNotFoundError:
+            return True
+
+    def acquire(self, key: str) -> bool:
+        """
+        Acquire the lease of a key.
+
+        :param key: the key, e.g a sample pack key.
+        :return: True if the lease is held by this owner, else False.
+        """
+        if key in self._held:
+            return True
+
+        self._path.mkdir(parents=True, exist_ok=True)
+        lease = self._lease(key)
+
+        try:
+            fd = os.open(lease, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            owner = self._read_owner(lease)
+            # a restarted shard takes back its own leases right away
+            if owner != self._owner and not self._is_stale(lease):
+                return False
+
+            log.info(f'taking over lease {key} from {owner}')
+            tmp = lease.with_name(f'{lease.name}.{os.getpid()}.tmp')
+            tmp.write_text(self._owner, encoding='utf-8')
+            os.replace(tmp, lease)
+
+            # another owner may have taken it over at the same time
+            if self._read_owner(lease) != self._owner:
+                return False
+        else:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(self._owner)
+
+        self._held.add(key)
+        return True
+
+    def release(self, key: str):
+        """
+        Release the lease of a key.
+
+        :param key: the key.
+        """
+        if key in self._held:
+            self._held.discard(key)
+            lease = self._lease(key)
+            if self._read_owner(lease) == self._owner:
+                with suppress(FileNotFoundError):
+                    lease.unlink()
+
+    def release_all(self):
+        """ Release all leases held. """
+        for key in list(self._held):
+            self.release(key)
+
+    @asynccontextmanager
+    async def lock(self, key: str, interval: float = 0.1):
+        """
+        Wait for the lease of a key, and release it when done.
+
+        :param key: the key.
+        :param interval: seconds between attempts.
+        """
+        while not self.acquire(key):
+            await asyncio.sleep(interval)
+        try:
+            yield
+        finally:
+            self.release(key)
+
+    def start(self):
+        """ Start touching the held leases, so they do not go stale. """
+        if self._task is None:
+            self._task = asyncio.create_task(self._keep_alive())
+
+    async def stop(self):
+        """ Stop touching the held leases, and release them. """
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+        self.release_all()
+
+    async def _keep_alive(self):
+        while True:
+            await asyncio.sleep(self._timeout / 3)
+            for key in list(self._held):
+                with suppress(FileNotFoundError):
+                    os.utime(self._lease(key))
+
+
+class Shard:
+    """
+    A shard of the sample packs.
+
+    The sample packs are split over the shards by consistent hashing
+    on the file name, so every host or process running a shard with
+    the same amount of shards agrees on which shard downloads a
+    sample pack, without talking to each other.
+    """
+    def __init__(self, index: int, shards: int, leases: Leases = None):
+        """
+        Initialize the Shard class.
+
+        :param index: the index of this shard, from 0 to shards - 1.
+        :param shards: the amount of shards.
+        :param leases: Leases object, to claim the sample packs with, or None.
+        """
+        if not 0 <= index < shards:
+            raise ValueError(f'shard must be from 0 to {shards - 1}, not {index}')
+
+        self._index = index
+        self._ring = HashRing(shards)
+        self._leases = leases
+        self.skipped = 0
+        self.leased = 0
+
+    @property
+    def index(self) -> int:
+        return self._index
+
+    @property
+    def name(self) -> str:
+        """ name of the shard, unique for every amount of shards. e.g `1-of-4` """
+        return f'{self._index}-of-{self._ring.shards}'
+
+    @property
+    def leases(self):
+        """
+        The leases of the shard.
+
+        :rtype: Leases | None
+        """
+        return self._leases
+
+    @leases.setter
+    def leases(self, leases: Leases):
+        self._leases = leases
+
+    def owns(self, sample_pack) -> bool:
+        """
+        Check if a sample pack belongs to this shard.
+
+        :param sample_pack: SamplePack object.
+        :return: True if it belongs to this shard, else False.
+        """
+        return self._ring.shard(sample_pack.file_name) == self._index
+
+    async def filter(self, sample_packs, root: Path, old_names: set):
+        """
+        The sample packs of this shard.
+
+        With leases, a sample pack is skipped while another shard holds
+        its lease, e.g while shards are added or removed, or if another shard
+        downloaded it to a shared root directory after this shard started.
+
+        :param sample_packs: async iterable of SamplePack objects.
+        :param root: the root directory of the sample packs.
+        :param old_names: names of the sample packs on disk at the start.
+        :return: async generator of SamplePack objects.
+        """
+        async for sp in sample_packs:
+            if not self.owns(sp):
+                self.skipped += 1
+                continue
+
+            if self._leases is not None:
+                if not self._leases.acquire(sp.key):
+                    log.info(f'{sp.file_name} is leased by another shard')
+                    self.leased += 1
+                    continue
+
+                if sp.file_name not in old_names and root.joinpath(sp.file_name).is_file():
+                    log.info(f'{sp.file_name} was downloaded by another shard')
+                    self._leases.release(sp.key)
+                    self.leased += 1
+                    continue
+
+            yield sp
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2024 Nortxort
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+
+import unittest
+
+from concurrency import AdaptiveConcurrency
+
+
+class AdaptiveConcurrencyTest(unittest.TestCase):
+
+    def test_no_requests(self):
+        controller = AdaptiveConcurrency(2)
+
+        self.assertEqual(2, controller.adjust())
+
+    def test_bytes_of_running_requests(self):
+        controller = AdaptiveConcurrency(2)
+        controller.add_bytes(1024)
+
+        self.assertEqual(3, controller.adjust())
+
+    def test_errors(self):
+        controller = AdaptiveConcurrency(4)
+        controller.add_bytes(1024)
+        controller.record(error=True)
+
+        self.assertEqual(2, controller.adjust())
+
+    def test_no_gain(self):
+        controller = AdaptiveConcurrency(2)
+        controller.add_bytes(1024 * 1024)
+        self.assertEqual(3, controller.adjust())
+
+        # the increase is undone, when the rate did not go up
+        controller.add_bytes(1)
+        self.assertEqual(2, controller.adjust())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2024 Nortxort
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+
+import tempfile
+import unittest
+from collections import Counter
+from pathlib import Path
+
+from aiohttp import web as aioweb
+from aiohttp.test_utils import TestServer
+
+from bench.fake_server import FakeServer
+from web import Session, DOWNLOAD_PROFILE, ERROR_CONNECTION
+from concurrency import AdaptiveConcurrency
+from downloader import Downloader
+from retry import RetryScheduler
+from samplepack import SamplePack
+
+
+class SegmentedDownloadTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.methods = Counter()
+        self.ranges = []
+        # the Range header of a request that fails once
+        self.cut = None
+
+        @aioweb.middleware
+        async def count(request, handler):
+            self.methods[request.method] += 1
+            if request.method == 'GET':
+                self.ranges.append(request.headers.get('Range', ''))
+                if self.cut is not None and request.headers.get('Range') == self.cut:
+                    self.cut = None
+                    return aioweb.Response(status=503)
+            return await handler(request)
+
+        self.fake = FakeServer('', [], zip_sizes=(16 * 1024,))
+        app = self.fake.app()
+        app.middlewares.append(count)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.addAsyncCleanup(self.server.close)
+
+        Session.create_pool(Downloader.POOL, DOWNLOAD_PROFILE)
+        self.addAsyncCleanup(Session.close)
+
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.path = Path(self._tmp.name)
+
+    def packs(self, content_length: int) -> list:
+        return [SamplePack('', str(self.server.make_url(f'/{name}.zip')), name,
+                           content_length=content_length) for name in ('a', 'b')]
+
+    async def test_unknown_size(self):
+        downloader = Downloader(self.path, self.packs(0), segment_threshold=64 * 1024)
+
+        self.assertEqual(2, await downloader.start(2))
+        self.assertEqual(2, self.methods['HEAD'])
+
+    async def test_known_small_size(self):
+        downloader = Downloader(self.path, self.packs(16 * 1024), segment_threshold=64 * 1024)
+
+        self.assertEqual(2, await downloader.start(2))
+        self.assertEqual(0, self.methods['HEAD'])
+        self.assertEqual(2, self.methods['GET'])
+
+    async def test_known_large_size(self):
+        downloader = Downloader(self.path, self.packs(16 * 1024), segment_threshold=4096)
+
+        self.assertEqual(2, await downloader.start(2))
+        self.assertEqual(2, self.methods['HEAD'])
+        # a GET for every segment
+        self.assertEqual(8, self.methods['GET'])
+
+
+    async def test_controller_bytes(self):
+        body = self.fake.zip_file('/a.zip')
+        self.path.joinpath('a.zip.part').write_bytes(body[:4096])
+        controller = AdaptiveConcurrency(1, interval=60)
+        downloader = Downloader(self.path, self.packs(0)[:1], controller=controller)
+
+        self.assertEqual(1, await downloader.start(1))
+        # the bytes resumed from disk are not counted
+        self.assertEqual(len(body) - 4096, controller._bytes)
+        self.assertEqual(1, controller._requests)
+
+    def cut_last_range(self) -> tuple:
+        # the last of 4 ranges of a.zip
+        body = self.fake.zip_file('/a.zip')
+        step = -(-len(body) // 4)
+        self.cut = f'bytes={3 * step}-{len(body) - 1}'
+        return body, self.cut
+
+    async def test_retry_missing_range(self):
+        body, cut = self.cut_last_range()
+        downloader = Downloader(self.path, self.packs(0)[:1], segment_threshold=4096,
+                                retry=RetryScheduler(base_delay=0.01))
+
+        self.assertEqual(1, await downloader.start(1))
+
+        # only the range that failed is fetched again
+        self.assertEqual(5, len(self.ranges))
+        self.assertEqual(4, len(set(self.ranges)))
+        self.assertEqual(2, self.ranges.count(cut))
+        self.assertEqual(body, self.path.joinpath('a.zip').read_bytes())
+        self.assertEqual(['a.zip'], [p.name for p in self.path.iterdir()])
+
+    async def test_resume_segments(self):
+        body, cut = self.cut_last_range()
+        retry = RetryScheduler(budgets={})
+        downloader = Downloader(self.path, self.packs(0)[:1], segment_threshold=4096, retry=retry)
+
+        self.assertEqual(0, await downloader.start(1))
+        self.assertEqual(ERROR_CONNECTION, retry.dead_letters[0]['error'])
+        self.assertEqual('a range request failed', retry.dead_letters[0]['reason'])
+        self.assertTrue(self.path.joinpath('a.zip.segments').is_file())
+
+        # a later run continues the segments
+        self.ranges.clear()
+        downloader = Downloader(self.path, self.packs(0)[:1], segment_threshold=4096)
+
+        self.assertEqual(1, await downloader.start(1))
+        self.assertEqual([cut], self.ranges)
+        self.assertEqual(body, self.path.joinpath('a.zip').read_bytes())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2024 Nortxort
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import random
+import unittest
+
+from extractor import stream_sample_packs, bs4_sample_packs, \
+     stream_sample_page_urls, bs4_sample_page_urls
+
+
+# tokens of random, often malformed, pages
+TOKENS = [
+    '<p>', '</p>', '<p/>', '<p class="y">', '<a href="y.zip">', '<a href="x.zip">',
+    '<a href="z.zip"/>', '<a>', '</a>', '<div>', '</div>', '<div class="x">',
+    '<b>', '</b>', '<br>', '<span>', '</span>', '<script>', '</script>',
+    '<style>', '</style>', '<template>', '</template>', '<rt>', '</rt>',
+    '<rp>', '</rp>', '<pre>', '</pre>', '<textarea>', '</textarea>',
+    '<!-- c -->', '<!DOCTYPE x>', '<?pi?>', '&amp;', '&lt;', 't', ' ', '  ', '\n'
+]
+
+TEXT_COPY = '<div class="text-copy bodyCopy auto">'
+INDEX = '<div id="article-body">' + '<p><a href="u">u</a></p>' * 10
+
+
+def random_page(rng: random.Random, head: str) -> str:
+    body = ''.join(rng.choice(TOKENS) for _ in range(rng.randint(1, 30)))
+    tail = ''.join(rng.choice(TOKENS) for _ in range(3))
+    return f'{head}{body}</div>{tail}'
+
+
+class StreamBackendTest(unittest.TestCase):
+    """ The stream backend must extract the same as the bs4 backend. """
+    PAGES = 3000
+
+    def assert_same(self, html: str):
+        self.assertEqual(stream_sample_packs(html), bs4_sample_packs(html), html)
+        self.assertEqual(stream_sample_page_urls(html), bs4_sample_page_urls(html), html)
+
+    def test_nested_anchors_in_unclosed_paragraphs(self):
+        self.assert_same(f'{TEXT_COPY}<p><a href="y.zip"><p><a href="y.zip"></a>&amp;</div>')
+
+    def test_whitespace_strings(self):
+        self.assert_same(f'{TEXT_COPY}<p><a href="x.zip">t</b>   </a> \n <pre>  </pre></p></div>')
+
+    def test_random_sample_pages(self):
+        rng = random.Random(1)
+        for _ in range(self.PAGES):
+            self.assert_same(random_page(rng, TEXT_COPY))
+
+    def test_random_index_pages(self):
+        rng = random.Random(2)
+        for _ in range(self.PAGES):
+            self.assert_same(random_page(rng, INDEX))
+
+    def test_no_container(self):
+        self.assertIsNone(stream_sample_packs('<p><a href="x.zip">x</a></p>'))
+        self.assertEqual(stream_sample_page_urls('<p><a href="x">x</a></p>'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2024 Nortxort
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+
+import asyncio
+import os
+import signal
+import socket
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+
+from aiohttp.test_utils import TestServer
+
+from bench.fake_server import FakeServer
+from bench.extractor import synthetic_pages
+from web import Session, PAGE_PROFILE, DOWNLOAD_PROFILE, ERROR_UNEXPECTED
+from musicradar import MusicRadarParser
+from downloader import Downloader
+from retry import RetryScheduler
+from samplepack import SamplePack
+from unpacker import Unpacker
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class FailureTest(unittest.IsolatedAsyncioTestCase):
+    """
+    A failing item must be retried or dead lettered,
+    and never leave a queue waiting on it.
+    """
+    async def serve(self, **faults) -> FakeServer:
+        index, pages = synthetic_pages(2)
+        port = free_port()
+        fake = FakeServer(index, pages, zip_sizes=(4096,), port=port, **faults)
+        server = TestServer(fake.app(), host=fake.host, port=port)
+        await server.start_server()
+        self.addAsyncCleanup(server.close)
+
+        Session.create_pool(MusicRadarParser.POOL, PAGE_PROFILE)
+        Session.create_pool(Downloader.POOL, DOWNLOAD_PROFILE)
+        self.addAsyncCleanup(Session.close)
+        return fake
+
+    def parser(self, fake: FakeServer, **kwargs) -> MusicRadarParser:
+
+        class FakeParser(MusicRadarParser):
+            _BASE_URL = fake.base_url
+            _INDEX_URL = fake.index_url
+
+        return FakeParser(**kwargs)
+
+    async def test_unwritable_part_file(self):
+        fake = await self.serve()
+        with tempfile.TemporaryDirectory() as tmp:
+            # the .part file can not be opened, which is not a connection error
+            Path(tmp, 'a.zip.part').mkdir()
+            packs = [SamplePack('', f'{fake.base_url}{name}', name) for name in ('a.zip', 'b.zip')]
+            retry = RetryScheduler(base_delay=0.01)
+            downloader = Downloader(Path(tmp), packs, retry=retry)
+
+            downloaded = await asyncio.wait_for(downloader.start(2), 10)
+
+        self.assertEqual(1, downloaded)
+        self.assertEqual([packs[0].url], [dead['key'] for dead in retry.dead_letters])
+        self.assertEqual(ERROR_UNEXPECTED, retry.dead_letters[0]['error'])
+
+    async def test_download_errors(self):
+        fake = await self.serve(errors=1.0)
+        with tempfile.TemporaryDirectory() as tmp:
+            packs = [SamplePack('', f'{fake.base_url}a.zip', 'a')]
+            retry = RetryScheduler(budgets={})
+            downloader = Downloader(Path(tmp), packs, retry=retry)
+
+            downloaded = await asyncio.wait_for(downloader.start(1), 10)
+
+        self.assertEqual(0, downloaded)
+        self.assertEqual('status 503', retry.dead_letters[0]['reason'])
+
+    async def test_index_errors(self):
+        fake = await self.serve(errors=1.0)
+        retry = RetryScheduler(base_delay=0.01)
+        parser = self.parser(fake, retry=retry)
+
+        parsed = await asyncio.wait_for(parser.start(2), 10)
+
+        self.assertEqual(0, parsed)
+        self.assertEqual([fake.index_url], [dead['key'] for dead in retry.dead_letters])
+
+    async def test_extractor_error(self):
+        fake = await self.serve()
+        retry = RetryScheduler(base_delay=0.01)
+        parser = self.parser(fake, pages_num=2, retry=retry)
+
+        def extract(html):
+            raise ValueError('malformed page')
+
+        parser._extract_packs = extract
+        parsed = await asyncio.wait_for(parser.start(2), 10)
+
+        self.assertEqual(0, parsed)
+        self.assertEqual(2, len(retry.dead_letters))
+        self.assertEqual({ERROR_UNEXPECTED}, {dead['error'] for dead in retry.dead_letters})
+
+
+class UnpackerFailureTest(unittest.IsolatedAsyncioTestCase):
+
+    @unittest.skipUnless(hasattr(signal, 'SIGKILL'), 'needs SIGKILL')
+    async def test_killed_process(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            packs = []
+            for name in ('a', 'b'):
+                path = Path(tmp, f'{name}.zip')
+                with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as z:
+                    z.writestr('sample.wav', os.urandom(1024) * 1024)
+                pack = SamplePack('', f'https://example.com/{name}.zip', name)
+                pack.path = str(path)
+                packs.append(pack)
+
+            unpacker = Unpacker(processes=1)
+            unpacker.start()
+            await unpacker.put(packs[0])
+
+            # kill the process before it is done with the first pack
+            executor = unpacker._executor
+            while not executor._processes:
+                await asyncio.sleep(0.01)
+            for process in list(executor._processes.values()):
+                os.kill(process.pid, signal.SIGKILL)
+
+            await unpacker.put(packs[1])
+            unpacked = await asyncio.wait_for(unpacker.stop(), 60)
+
+            self.assertEqual(1, unpacker.failed)
+            self.assertEqual(1, unpacked)
+            self.assertTrue(Path(tmp, 'b', 'sample.wav').exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2024 Nortxort
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+
+import unittest
+
+from aiohttp.test_utils import TestServer
+
+from bench.fake_server import FakeServer
+from web import Session, DOWNLOAD_PROFILE
+from probe import Probe
+from samplepack import SamplePack
+
+
+async def iterate(items):
+    for item in items:
+        yield item
+
+
+async def broken(items):
+    for item in items:
+        yield item
+    raise ValueError('parser failed')
+
+
+class ProbeStreamTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.fake = FakeServer('', [], zip_sizes=(4096, 8192))
+        self.server = TestServer(self.fake.app())
+        await self.server.start_server()
+        self.addAsyncCleanup(self.server.close)
+
+        Session.create_pool('probe', DOWNLOAD_PROFILE)
+        self.addAsyncCleanup(Session.close)
+
+    def packs(self, names) -> list:
+        return [SamplePack('', str(self.server.make_url(f'/{name}')), name) for name in names]
+
+    async def test_stream(self):
+        # the fake server only serves zip files
+        packs = self.packs([f'pack-{i}.zip' for i in range(20)] + ['dead.html'])
+        probe = Probe(4, 'probe')
+
+        probed = [sp async for sp in probe.stream(iterate(packs))]
+
+        self.assertEqual({sp.url for sp in packs[:-1]}, {sp.url for sp in probed})
+        self.assertEqual([packs[-1]], probe.dead)
+        for sp in probed:
+            self.assertEqual(len(self.fake.zip_file(f'/{sp.file_name}')), sp.content_length)
+        self.assertEqual(sum(sp.content_length for sp in probed), probe.total_bytes)
+        self.assertEqual(0, probe.unknown)
+
+    async def test_broken_source(self):
+        probe = Probe(4, 'probe')
+
+        with self.assertRaises(ValueError):
+            [sp async for sp in probe.stream(broken(self.packs(['a.zip', 'b.zip'])))]
+
+
+if __name__ == '__main__':
+    unittest.main()
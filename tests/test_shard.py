@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2024 Nortxort
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from file_handler import FileHandler
+from manifest import Manifest
+from samplepack import SamplePack
+from shard import HashRing, Leases, Shard
+
+
+KEYS = [f'pack-{i}.zip' for i in range(2000)]
+
+
+def sample_pack(name: str) -> SamplePack:
+    return SamplePack('https://example.com/page', f'https://example.com/{name}.zip', name)
+
+
+async def collect(async_iterable) -> list:
+    return [item async for item in async_iterable]
+
+
+async def iterate(items):
+    for item in items:
+        yield item
+
+
+class HashRingTest(unittest.TestCase):
+
+    def test_same_split(self):
+        a, b = HashRing(4), HashRing(4)
+        self.assertEqual([a.shard(key) for key in KEYS], [b.shard(key) for key in KEYS])
+
+    def test_balanced(self):
+        ring = HashRing(4)
+        shards = [ring.shard(key) for key in KEYS]
+        for shard in range(4):
+            self.assertGreater(shards.count(shard), len(KEYS) / 4 * 0.7)
+
+    def test_add_shard(self):
+        old, new = HashRing(4), HashRing(5)
+        moved = [key for key in KEYS if old.shard(key) != new.shard(key)]
+
+        # only the keys of the new shard move, about 1/5 of them
+        self.assertTrue(all(new.shard(key) == 4 for key in moved))
+        self.assertLess(len(moved), len(KEYS) * 0.3)
+
+    def test_remove_shard(self):
+        old, new = HashRing(5), HashRing(4)
+        moved = [key for key in KEYS if old.shard(key) != new.shard(key)]
+
+        # only the keys of the removed shard move
+        self.assertTrue(all(old.shard(key) == 4 for key in moved))
+        self.assertEqual(len(moved), sum(1 for key in KEYS if old.shard(key) == 4))
+
+    def test_no_shards(self):
+        with self.assertRaises(ValueError):
+            HashRing(0)
+
+
+class LeasesTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_acquire(self):
+        a, b = Leases(self.path, 'a'), Leases(self.path, 'b')
+
+        self.assertTrue(a.acquire('x'))
+        self.assertTrue(a.acquire('x'))
+        self.assertFalse(b.acquire('x'))
+        self.assertTrue(b.acquire('y'))
+        self.assertEqual(1, a.held)
+
+    def test_release(self):
+        a, b = Leases(self.path, 'a'), Leases(self.path, 'b')
+        a.acquire('x')
+        a.release('x')
+
+        self.assertFalse(self.path.joinpath('x.lease').exists())
+        self.assertTrue(b.acquire('x'))
+
+    def test_own_lease(self):
+        Leases(self.path, 'a').acquire('x')
+
+        # a restarted owner takes back its lease right away
+        self.assertTrue(Leases(self.path, 'a').acquire('x'))
+        self.assertFalse(Leases(self.path, 'b').acquire('x'))
+
+    def test_stale_lease(self):
+        a, b = Leases(self.path, 'a', timeout=60), Leases(self.path, 'b', timeout=60)
+        a.acquire('x')
+
+        lease = self.path.joinpath('x.lease')
+        stale = time.time() - 120
+        os.utime(lease, (stale, stale))
+
+        self.assertTrue(b.acquire('x'))
+        self.assertEqual('b', lease.read_text(encoding='utf-8'))
+
+        # the old owner does not remove the lease taken over
+        a.release('x')
+        self.assertTrue(lease.exists())
+        b.release('x')
+        self.assertFalse(lease.exists())
+
+
+class ShardTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_owns(self):
+        shards = [Shard(i, 3) for i in range(3)]
+        for key in KEYS[:300]:
+            sp = sample_pack(key)
+            self.assertEqual(1, sum(shard.owns(sp) for shard in shards))
+
+    def test_filter_other_shards(self):
+        packs = [sample_pack(f'pack-{i}') for i in range(100)]
+        shard = Shard(1, 3)
+
+        found = asyncio.run(collect(shard.filter(iterate(packs), self.root, set())))
+
+        self.assertEqual([sp for sp in packs if shard.owns(sp)], found)
+        self.assertEqual(len(packs) - len(found), shard.skipped)
+
+    def test_filter_leased(self):
+        leases_path = self.root.joinpath(Leases.DIR_NAME)
+        packs = [sample_pack(name) for name in ('a', 'b', 'c', 'd')]
+        shard = Shard(0, 1, Leases(leases_path, 'shard-0'))
+
+        # b is downloaded by another shard
+        Leases(leases_path, 'other').acquire('b')
+        # c was downloaded by another shard after this shard started
+        self.root.joinpath('c.zip').write_bytes(b'')
+        # d was on disk at the start
+        self.root.joinpath('d.zip').write_bytes(b'')
+
+        found = asyncio.run(collect(shard.filter(iterate(packs), self.root, {'d.zip'})))
+
+        self.assertEqual(['a', 'd'], [sp.key for sp in found])
+        self.assertEqual(2, shard.leased)
+        self.assertEqual(2, shard.leases.held)
+        self.assertFalse(leases_path.joinpath('c.lease').exists())
+
+    def test_index(self):
+        with self.assertRaises(ValueError):
+            Shard(3, 3)
+
+
+class ManifestMergeTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_merge(self):
+        Manifest(self.root).update(sample_pack('a'))
+        first, second = Manifest(self.root, '0-of-2'), Manifest(self.root, '1-of-2')
+        first.load()
+        second.load()
+        first.update(sample_pack('b'))
+        second.update(sample_pack('c'))
+
+        self.assertEqual(3, first.merge())
+
+        main = Manifest(self.root)
+        main.load()
+        self.assertEqual(3, len(main))
+        self.assertEqual({'a.zip', 'b.zip', 'c.zip'},
+                         {r['file_name'] for r in Manifest._read(main.path).values()})
+
+        # the shards only save their own records
+        self.assertEqual(['b.zip'], list(Manifest._read(first.path)))
+        self.assertEqual(['c.zip'], list(Manifest._read(second.path)))
+
+    def test_merge_replaced(self):
+        first = Manifest(self.root, '0-of-2')
+        first.update(sample_pack('a'))
+        # the manifest of the shard is replaced, e.g by a shard with the same name
+        first.path.unlink()
+        Manifest(self.root, '1-of-2').update(sample_pack('b'))
+
+        self.assertEqual(2, first.merge())
+
+    def test_merge_without_shards(self):
+        Manifest(self.root, '0-of-2').update(sample_pack('a'))
+        Manifest(self.root, '1-of-2').update(sample_pack('b'))
+
+        # a run without shards merges, even when it downloaded nothing
+        self.assertEqual(2, Manifest(self.root).merge())
+        self.assertEqual({'a.zip', 'b.zip'}, set(Manifest._read(Manifest(self.root).path)))
+
+    def test_create_existing_dir(self):
+        # another shard may create the directory first
+        fh = FileHandler(str(self.root.joinpath('samples', 'drums')))
+        fh.create_dir()
+        fh.create_dir()
+
+        self.assertTrue(fh.is_dir())
+
+
+if __name__ == '__main__':
+    unittest.main()
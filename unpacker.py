@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2024 Nortxort
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import asyncio
+import logging
+import shutil
+import zipfile
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from concurrency import WorkerPool, spawn_executor
+
+
+log = logging.getLogger(__name__)
+
+
+def unpack_zip(path: str, dest: str, delete: bool = False,
+               chunk_size: int = 1024 * 1024) -> tuple:
+    """
+    Unpack a zip file, one member at a time.
+
+    The members are written to a hidden directory next to dest, which is
+    renamed to dest once all members are written. An interrupted unpack
+    therefore never looks like an unpacked sample pack.
+
+    :param path: path to the zip file.
+    :param dest: path to the directory to unpack to. Must not exist.
+    :param delete: delete the zip file after unpacking.
+    :param chunk_size: chunk size to copy the members in.
+    :return: the amount of files and bytes unpacked.
+    """
+    dest = Path(dest)
+    tmp = dest.with_name(f'.{dest.name}.unpacking')
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir()
+
+    files = 0
+    size = 0
+    try:
+        root = tmp.resolve()
+        with zipfile.ZipFile(path) as z:
+            for info in z.infolist():
+                target = tmp.joinpath(info.filename).resolve()
+                if not target.is_relative_to(root):
+                    log.warning(f'skipping {info.filename} outside of {dest}')
+                    continue
+
+                if info.is_dir():
+                    target.mkdir(parents=True, exist_ok=True)
+                    continue
+
+                target.parent.mkdir(parents=True, exist_ok=True)
+                with z.open(info) as src, open(target, 'wb') as dst:
+                    shutil.copyfileobj(src, dst, chunk_size)
+
+                files += 1
+                size += info.file_size
+
+        tmp.replace(dest)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+    if delete:
+        Path(path).unlink()
+
+    return files, size
+
+
+class Unpacker:
+    """
+    Unpacks downloaded sample packs in a process pool.
+
+    Sample packs are added with `put` as they are downloaded,
+    and unpacked next to the zip file, in a directory named
+    after the sample pack.
+    """
+    def __init__(self, processes: int = 2, queue_size: int = 100, delete: bool = False):
+        """
+        Initialize the Unpacker class.
+
+        :param processes: the amount of zip files unpacked at the same time.
+        :param queue_size: max size of the unpack queue.
+        :param delete: delete the zip files after unpacking them.
+        """
+        self._processes = processes
+        self._delete = delete
+        self._main_queue = asyncio.Queue(maxsize=queue_size)
+        self._executor = None
+        self._pool = None
+        self._unpacked = 0
+        self._unpacked_bytes = 0
+        self._failed = 0
+
+    @property
+    def unpacked(self) -> int:
+        """ The amount of sample packs unpacked. """
+        return self._unpacked
+
+    @property
+    def unpacked_bytes(self) -> int:
+        """ The amount of bytes unpacked. """
+        return self._unpacked_bytes
+
+    @property
+    def failed(self) -> int:
+        """ The amount of sample packs that could not be unpacked. """
+        return self._failed
+
+    def start(self):
+        """
+        Start the process pool and the workers feeding it.
+
+        Call `stop` when done.
+        """
+        self._executor = spawn_executor(self._processes)
+        self._pool = WorkerPool(self._queue_worker, self._processes)
+        self._pool.start()
+
+    async def put(self, pack):
+        """
+        Add a downloaded sample pack to the unpack queue.
+
+        Waits for a free slot if the queue is full.
+
+        :param pack: SamplePack object.
+        """
+        log.debug(f'adding {pack.path} to unpack queue')
+        await self._main_queue.put(pack)
+
+    async def stop(self) -> int:
+        """
+        Wait for the unpack queue to be empty, and stop the workers.
+
+        :return: The amount of sample packs unpacked.
+        """
+        try:
+            await self._main_queue.join()
+        finally:
+            self._pool.cancel()
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+        return self._unpacked
+
+    async def _queue_worker(self, num: int):
+        loop = asyncio.get_running_loop()
+
+        while self._pool.is_active(num):
+            pack = await self._main_queue.get()
+
+            path = Path(pack.path)
+            dest = path.with_name(pack.key)
+
+            try:
+                if dest.exists():
+                    log.info(f'{dest} already exists, not unpacking {path}')
+                    continue
+
+                log.debug(f'worker-{num} unpacking: {path}')
+                executor = self._executor
+                files, size = await loop.run_in_executor(
+                    executor, unpack_zip, str(path), str(dest), self._delete)
+
+                log.debug(f'unpacked {files} files({size} bytes) from {path}')
+                self._unpacked += 1
+                self._unpacked_bytes += size
+
+            except (zipfile.BadZipFile, OSError, ValueError) as e:
+                log.error(f'failed to unpack {path}: {e}')
+                self._failed += 1
+
+            except BrokenProcessPool as e:
+                # a process was killed, e.g by the OOM killer. the other
+                # workers using the same pool fail too, but only one replaces it
+                log.error(f'failed to unpack {path}: {e}')
+                self._failed += 1
+                if self._executor is executor:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    self._executor = spawn_executor(self._processes)
+
+            finally:
+                self._main_queue.task_done()
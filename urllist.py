@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2024 Nortxort
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+from datetime import date
+from pathlib import Path
+
+from samplepack import SamplePack
+
+
+log = logging.getLogger(__name__)
+
+# read the urls from stdin
+STDIN = '-'
+
+
+def _parse_line(line: str) -> str:
+    """ The url on a line, or '' for comments, empty and invalid lines. """
+    url = line.strip()
+    if not url or url.startswith('#'):
+        return ''
+
+    if not url.startswith(('http://', 'https://')) or not url.endswith('.zip'):
+        log.warning(f'ignoring invalid sample pack url: {url}')
+        return ''
+
+    return url
+
+
+async def _read_lines(path: str):
+    if path == STDIN:
+        # stdin may be a pipe that is still being written to,
+        # so lines are read in a thread, without blocking the event loop.
+        while line := await asyncio.to_thread(sys.stdin.readline):
+            yield line
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                yield line
+
+
+async def read_urls(path: str):
+    """
+    Read sample pack urls from a file like urls.txt, or from stdin.
+
+    The file is read lazily, so the first sample pack is
+    available before the whole file is read. Lines that are empty
+    or start with # are skipped, and so are duplicate urls.
+
+    :param path: path to the file, or - to read from stdin.
+    :return: async generator of SamplePack objects.
+    """
+    seen = set()
+    async for line in _read_lines(path):
+        url = _parse_line(line)
+        if url and url not in seen:
+            seen.add(url)
+            yield SamplePack('', url, '')
+
+
+def load_urls(path: Path) -> list:
+    """
+    All sample pack urls in a file, in order.
+
+    :param path: path to the file.
+    :return: list of urls, empty if the file does not exist.
+    """
+    if not path.is_file():
+        return []
+
+    with open(path, 'r', encoding='utf-8') as f:
+        return list(dict.fromkeys(url for url in map(_parse_line, f) if url))
+
+
+def write_urls(path: Path, urls: list):
+    """
+    Write sample pack urls to a file, in the format of urls.txt.
+
+    :param path: path to the file.
+    :param urls: the urls, duplicates are written once.
+    """
+    tmp = path.with_name(f'{path.name}.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(f'# Sample pack urls ({date.today():%d/%m/%Y})\n\n')
+        f.write('\n'.join(dict.fromkeys(urls)))
+    os.replace(tmp, path)
+
+
+def diff_urls(old: list, new: list) -> tuple:
+    """
+    Compare two lists of urls.
+
+    :param old: the old urls.
+    :param new: the new urls.
+    :return: the added and the removed urls, in order.
+    """
+    old_set = set(old)
+    new_set = set(new)
+    return ([url for url in dict.fromkeys(new) if url not in old_set],
+            [url for url in dict.fromkeys(old) if url not in new_set])
@@ -25,9 +25,13 @@ DEALINGS IN THE SOFTWARE.
 """
 
 from .agent import DEFAULT_AGENT, COMMON_AGENTS, random_agent
-from .session import Session
-from .http import request, get, post, websocket, \
-     download_file, default_headers, put, patch, delete
+from .session import Session, PAGE_PROFILE, DOWNLOAD_PROFILE
+from .cache import ResponseCache, CachedResponse
+from .ratelimit import TokenBucket, RateLimiter
+from .http import request, get, head, post, websocket, \
+     download_file, download_range, preallocate, default_headers, put, patch, delete, \
+     status_error, exception_error, ERROR_CONNECTION, ERROR_TIMEOUT, ERROR_THROTTLED, \
+     ERROR_SERVER, ERROR_CLIENT, ERROR_INCOMPLETE, ERROR_UNEXPECTED
 
 __version__ = '2.3.0'  # 2.3.0 25/12/2024
 
@@ -37,13 +41,31 @@ __all__ = [
     'COMMON_AGENTS',
     'random_agent',
     'Session',
+    'PAGE_PROFILE',
+    'DOWNLOAD_PROFILE',
+    'ResponseCache',
+    'CachedResponse',
+    'TokenBucket',
+    'RateLimiter',
     'request',
     'get',
+    'head',
     'post',
     'websocket',
     'download_file',
+    'download_range',
+    'preallocate',
     'default_headers',
     'put',
     'patch',
-    'delete'
+    'delete',
+    'status_error',
+    'exception_error',
+    'ERROR_CONNECTION',
+    'ERROR_TIMEOUT',
+    'ERROR_THROTTLED',
+    'ERROR_SERVER',
+    'ERROR_CLIENT',
+    'ERROR_INCOMPLETE',
+    'ERROR_UNEXPECTED'
 ]
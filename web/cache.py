@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2024 Nortxort
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+from pathlib import Path
+
+
+log = logging.getLogger(__name__)
+
+
+class CachedResponse:
+    """
+    A response with a body served from the ResponseCache.
+
+    Provides the parts of aiohttp.ClientResponse used to read a body.
+    """
+    def __init__(self, url: str, headers: dict, body: bytes):
+        self.url = url
+        self.status = 200
+        self.headers = headers
+        self._body = body
+
+    async def read(self) -> bytes:
+        return self._body
+
+    async def text(self, encoding: str = None) -> str:
+        if encoding is None:
+            encoding = self.charset or 'utf-8'
+        return self._body.decode(encoding, errors='replace')
+
+    @property
+    def charset(self):
+        """ charset from the Content-Type header or None. """
+        content_type = self.headers.get('Content-Type', '')
+        for param in content_type.split(';')[1:]:
+            key, _, value = param.strip().partition('=')
+            if key.lower() == 'charset':
+                return value.strip('"')
+
+    def release(self):
+        pass
+
+    def __repr__(self):
+        return (f'<{__class__.__name__} '
+                f'url={self.url}, '
+                f'size={len(self._body)}>')
+
+
+class ResponseCache:
+    """
+    Size bounded LRU cache of response bodies, stored on disk.
+
+    Responses are cached by url together with their ETag and
+    Last-Modified headers, used to revalidate the cached body.
+    """
+    INDEX_FILE = 'index.json'
+
+    def __init__(self, path: str, max_size: int = 64 * 1024 * 1024):
+        """
+        Initialize the ResponseCache class.
+
+        :param path: path to the cache directory.
+        :param max_size: max size in bytes of all cached bodies.
+        """
+        self._path = Path(path)
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def size(self) -> int:
+        """ size in bytes of all cached bodies. """
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def load(self) -> int:
+        """
+        Load the cache index.
+
+        :return: the amount of cached responses.
+        """
+        index = self._path.joinpath(self.INDEX_FILE)
+        if index.is_file():
+            try:
+                with open(index, 'r', encoding='utf-8') as f:
+                    entries = json.load(f)
+            except (OSError, ValueError) as e:
+                log.error(f'failed to load cache index {index}: {e}')
+            else:
+                for url, entry in entries:
+                    if self._path.joinpath(entry['file']).is_file():
+                        self._entries[url] = entry
+                        self._size += entry['size']
+
+        log.debug(f'loaded {len(self._entries)} cached responses, {self._size} bytes')
+        return len(self._entries)
+
+    def save(self):
+        """ Save the cache index, in LRU order. """
+        self._path.mkdir(parents=True, exist_ok=True)
+
+        index = self._path.joinpath(self.INDEX_FILE)
+        tmp = index.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(list(self._entries.items()), f)
+
+        os.replace(tmp, index)
+
+    def validators(self, url: str) -> dict:
+        """
+        Conditional request headers for a cached url.
+
+        :param url: url of the resource.
+        :return: dictionary with If-None-Match and/or If-Modified-Since.
+        """
+        headers = {}
+        entry = self._entries.get(url)
+        if entry is not None:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        return headers
+
+    def response(self, url: str):
+        """
+        Get a cached response, and mark it as recently used.
+
+        :param url: url of the resource.
+        :return: CachedResponse or None.
+        :rtype: CachedResponse | None
+        """
+        entry = self._entries.get(url)
+        if entry is not None:
+            try:
+                body = self._path.joinpath(entry['file']).read_bytes()
+            except OSError as e:
+                log.error(f'failed to read cached response for {url}: {e}')
+                self._remove(url)
+            else:
+                self._entries.move_to_end(url)
+                self.hits += 1
+                return CachedResponse(url, {'Content-Type': entry['content_type']}, body)
+
+    def store(self, url: str, body: bytes, headers) -> bool:
+        """
+        Cache a response body, if it can be revalidated.
+
+        :param url: url of the resource.
+        :param body: the response body.
+        :param headers: the response headers.
+        :return: True if the body was cached.
+        """
+        self.misses += 1
+
+        etag = headers.get('ETag', '')
+        last_modified = headers.get('Last-Modified', '')
+        if (not etag and not last_modified) or len(body) > self._max_size:
+            return False
+
+        if url in self._entries:
+            self._remove(url)
+
+        self._path.mkdir(parents=True, exist_ok=True)
+
+        file_name = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        self._path.joinpath(file_name).write_bytes(body)
+
+        self._entries[url] = {
+            'file': file_name,
+            'etag': etag,
+            'last_modified': last_modified,
+            'content_type': headers.get('Content-Type', ''),
+            'size': len(body)
+        }
+        self._size += len(body)
+
+        while self._size > self._max_size:
+            oldest = next(iter(self._entries))
+            log.debug(f'evicting {oldest} from cache')
+            self._remove(oldest)
+
+        self.save()
+        return True
+
+    def _remove(self, url: str):
+        entry = self._entries.pop(url)
+        self._size -= entry['size']
+        try:
+            self._path.joinpath(entry['file']).unlink()
+        except FileNotFoundError:
+            pass
@@ -24,8 +24,11 @@ FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 DEALINGS IN THE SOFTWARE.
 """
 
+import asyncio
 import logging
+import os
 from collections import OrderedDict
+from pathlib import Path
 
 import aiohttp
 import aiofile
@@ -36,6 +39,46 @@ from .session import Session
 
 log = logging.getLogger(__name__)
 
+# error classes of failed requests
+ERROR_CONNECTION = 'connection'
+ERROR_TIMEOUT = 'timeout'
+ERROR_THROTTLED = 'throttled'
+ERROR_SERVER = 'server'
+ERROR_CLIENT = 'client'
+ERROR_INCOMPLETE = 'incomplete'
+# an exception that is not a failed request, e.g a full disk
+ERROR_UNEXPECTED = 'unexpected'
+
+
+def status_error(status: int) -> str:
+    """
+    Get the error class of a response status.
+
+    :param status: the response status.
+    :return: the error class, or an empty string if not an error.
+    """
+    if status == 429:
+        return ERROR_THROTTLED
+    if status >= 500:
+        return ERROR_SERVER
+    if status >= 400:
+        return ERROR_CLIENT
+    return ''
+
+
+def exception_error(error: BaseException) -> str:
+    """
+    Get the error class of an exception.
+
+    :param error: the exception.
+    :return: the error class.
+    """
+    if isinstance(error, asyncio.TimeoutError):
+        return ERROR_TIMEOUT
+    if isinstance(error, aiohttp.ClientError):
+        return ERROR_CONNECTION
+    return ERROR_UNEXPECTED
+
 
 def default_headers(headers: dict = None, rua: bool = False) -> dict:
     """
@@ -68,6 +111,7 @@ async def request(method: str, url: str, **kwargs):
     :param url: url for the request.
     :param kwargs: keywords, see
     https://docs.aiohttp.org/en/stable/client_reference.html#aiohttp.ClientSession.request
+    and `pool`, the name of a Session pool to make the request with.
     :return: aiohttp.ClientResponse or None on error.
     :rtype: aiohttp.ClientResponse | None
     """
@@ -77,12 +121,9 @@ async def request(method: str, url: str, **kwargs):
     header = kwargs.get('headers')
     kwargs['headers'] = default_headers(header, kwargs.pop('rua', False))
 
-    if Session.session is None:
-        session = Session.create()
-    else:
-        session = Session.session
+    session = Session.get(kwargs.pop('pool', None))
 
-    log.debug(f'{method} {url} {kwargs}')
+    log.debug('%s %s %s', method, url, kwargs)
 
     try:
         if method == 'websocket':
@@ -93,6 +134,9 @@ async def request(method: str, url: str, **kwargs):
     except aiohttp.ClientError as e:
         error = f'web error: {e}'
 
+    except asyncio.TimeoutError:
+        error = f'web error: timeout {method} {url}'
+
     finally:
         if error is not None:
             log.error(error, exc_info=True)
@@ -100,38 +144,292 @@ async def request(method: str, url: str, **kwargs):
         return response
 
 
-async def download_file(url: str, path: str,
-                        chunk_size: int = 4096, **kwargs) -> tuple:
+class _BufferedWriter:
+    """
+    Collects chunks in a reusable buffer, and writes the buffer
+    to the file at its offset once it is full.
+    """
+    def __init__(self, f: aiofile.AIOFile, offset: int, buffer_size: int):
+        self._f = f
+        self._buffer = bytearray(buffer_size)
+        self._view = memoryview(self._buffer)
+        self._pos = 0
+        self.offset = offset
+
+    async def write(self, data: bytes):
+        n = len(data)
+        if self._pos + n > len(self._buffer):
+            await self.flush()
+
+        if n >= len(self._buffer):
+            await self._f.write(data, offset=self.offset)
+            self.offset += n
+        else:
+            self._view[self._pos:self._pos + n] = data
+            self._pos += n
+
+    async def flush(self):
+        if self._pos > 0:
+            # aiofile only writes bytes, so this is the one copy of the data
+            await self._f.write(bytes(self._view[:self._pos]), offset=self.offset)
+            self.offset += self._pos
+            self._pos = 0
+
+
+async def _write_response(response, f: aiofile.AIOFile, offset: int,
+                          chunk_size: int, buffer_size: int, hasher=None,
+                          limiter=None, progress=None) -> int:
+    """
+    Write the response body to a file, starting at offset.
+
+    :return: the amount of bytes written.
+    """
+    writer = _BufferedWriter(f, offset, buffer_size)
+    host = response.url.host
+    try:
+        async for data in response.content.iter_chunked(chunk_size):
+            if hasher is not None:
+                hasher.update(data)
+            await writer.write(data)
+            if progress is not None:
+                progress(len(data))
+            if limiter is not None:
+                await limiter.consume(host, len(data))
+    finally:
+        # keep what was received, so a part file can be resumed
+        await writer.flush()
+
+    return writer.offset - offset
+
+
+def _hash_file(path: Path, hasher, size: int, chunk_size: int = 1024 * 1024):
+    """
+    Update a hash object with the first size bytes of a file.
+    """
+    with open(path, 'rb') as f:
+        while size > 0:
+            data = f.read(min(chunk_size, size))
+            if not data:
+                break
+            hasher.update(data)
+            size -= len(data)
+
+
+def preallocate(fileno: int, size: int):
+    """
+    Preallocate disk space for a file, if the platform supports it.
+
+    :param fileno: file descriptor of the file.
+    :param size: size in bytes.
+    """
+    if hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(fileno, 0, size)
+            return
+        except OSError as e:
+            log.debug(f'posix_fallocate failed: {e}')
+
+    os.truncate(fileno, size)
+
+
+async def download_file(url: str, path: str, chunk_size: int = 64 * 1024,
+                        resume: bool = False, buffer_size: int = 1024 * 1024,
+                        allocate: bool = False, hasher=None, limiter=None,
+                        if_range: str = '', progress=None, **kwargs) -> tuple:
     """
     Download file.
 
+    If resume is True, the data is written to a `.part` file next to path.
+    An existing `.part` file is continued with a `Range` request, and only
+    renamed to path once the download completed. If the server ignores
+    the range, the file is downloaded from the start.
+
     :param url: url of the file to download.
     :param path: path and file name of the file to save.
     :param chunk_size: chunk size to read from the response.
-    :return: path, size and header content length of file.
+    :param resume: resume a partial download from a `.part` file.
+    :param buffer_size: size of the buffer chunks are collected in,
+    before they are written to the file. 0 to write every chunk.
+    :param allocate: preallocate the file to the content length.
+    Not used when resuming, since the part file size is the resume offset.
+    :param hasher: hashlib object, updated with the file data as it is
+    received. A resumed part is hashed from disk first. Use a new
+    object for every call, it is only complete on success.
+    :param limiter: RateLimiter object to limit the bandwidth with.
+    :param if_range: strong ETag or Last-Modified date of the file, from
+    an earlier request. A resumed file that changed since is downloaded
+    from the start.
+    :param progress: function called with the size of every chunk received.
+    :return: path, size, header content length, response headers,
+    error class and description of the error. The error class
+    and description are empty on success.
+    """
+    part = Path(f'{path}.part') if resume else Path(path)
+    offset = 0
+
+    if resume and part.is_file():
+        offset = part.stat().st_size
+
+    if offset > 0:
+        # copy the headers, so the range is not added to the callers headers
+        headers = dict(default_headers(kwargs.get('headers'), kwargs.pop('rua', False)))
+        headers['Range'] = f'bytes={offset}-'
+        if if_range:
+            headers['If-Range'] = if_range
+        # a range applies to the encoded representation, so ask for none
+        headers['Accept-Encoding'] = 'identity'
+        kwargs['headers'] = headers
+
+    response = await request('GET', url=url, **kwargs)
+
+    if response is not None:
+
+        try:
+            if response.status == 416 and offset > 0:
+                # the range is past the end, check if the part file is complete
+                total = _content_range_total(response.headers.get('Content-Range', ''))
+                if total == offset:
+                    log.debug(f'{part} is already complete')
+                    if hasher is not None:
+                        await asyncio.to_thread(_hash_file, part, hasher, offset)
+                    part.replace(path)
+                    return path, offset, total, response.headers, '', ''
+
+                log.debug(f'invalid range for {url}, restarting download')
+                part.unlink()
+                kwargs['headers'].pop('Range')
+                kwargs['headers'].pop('If-Range', None)
+                response.release()
+                return await download_file(url, path, chunk_size=chunk_size, resume=resume,
+                                           buffer_size=buffer_size, allocate=allocate,
+                                           hasher=hasher, limiter=limiter,
+                                           progress=progress, **kwargs)
+
+            error = status_error(response.status)
+            if error:
+                log.error(f'download of {url} failed with status {response.status}')
+                return '', 0, 0, response.headers, error, f'status {response.status}'
+
+            cl = int(response.headers.get('Content-Length', 0))
+            if response.headers.get('Content-Encoding', 'identity') != 'identity':
+                # the content length is of the encoded body, not of the file
+                cl = 0
+            mode = 'wb'
+
+            if offset > 0:
+                content_range = response.headers.get('Content-Range', '')
+                if response.status == 206 and content_range.startswith(f'bytes {offset}-'):
+                    log.debug(f'resuming {url} at {offset} bytes')
+                    mode = 'r+b'
+                    cl += offset
+                    if hasher is not None:
+                        await asyncio.to_thread(_hash_file, part, hasher, offset)
+                else:
+                    log.debug(f'range ignored for {url}, downloading full file')
+                    offset = 0
+
+            log.debug(f'downloading {url} to {part}')
+
+            async with aiofile.AIOFile(part, mode) as f:
+
+                allocated = allocate and not resume and cl > 0
+                if allocated:
+                    preallocate(f.fileno(), cl)
+
+                size = offset + await _write_response(response, f, offset, chunk_size,
+                                                      buffer_size, hasher, limiter, progress)
+                log.debug(f'downloaded {size - offset} bytes from {url}')
+
+                if allocated and size != cl:
+                    os.truncate(f.fileno(), size)
+
+        except asyncio.TimeoutError:
+            log.error(f'download of {url} timed out at {part}')
+            return '', 0, 0, {}, ERROR_TIMEOUT, 'timed out'
+
+        except aiohttp.ClientError as e:
+            log.error(f'download of {url} failed at {part}: {e}')
+            return '', 0, 0, {}, ERROR_CONNECTION, repr(e)
+
+        finally:
+            response.release()
+
+        if 0 < cl != size:
+            log.debug(f'incomplete download {size}/{cl} bytes at {part}')
+            return '', 0, 0, {}, ERROR_INCOMPLETE, f'{size} of {cl} bytes'
+
+        if resume:
+            part.replace(path)
+
+        return path, size, cl, response.headers, '', ''
+
+    return '', 0, 0, {}, ERROR_CONNECTION, 'no response'
+
+
+async def download_range(url: str, path: str, start: int, end: int,
+                         chunk_size: int = 64 * 1024, buffer_size: int = 1024 * 1024,
+                         limiter=None, progress=None, **kwargs) -> int:
+    """
+    Download a byte range of a file, and write it at its offset in path.
+
+    The file at path must exist, preferably preallocated to the full size.
+
+    :param url: url of the file to download.
+    :param path: path and file name of the file to write to.
+    :param start: first byte of the range.
+    :param end: last byte of the range(inclusive).
+    :param chunk_size: chunk size to read from the response.
+    :param buffer_size: size of the buffer chunks are collected in,
+    before they are written to the file. 0 to write every chunk.
+    :param limiter: RateLimiter object to limit the bandwidth with.
+    :param progress: function called with the size of every chunk received.
+    :return: bytes written, or -1 if the range was not served.
     """
+    headers = dict(default_headers(kwargs.get('headers'), kwargs.pop('rua', False)))
+    headers['Range'] = f'bytes={start}-{end}'
+    headers['Accept-Encoding'] = 'identity'
+    kwargs['headers'] = headers
+
     response = await request('GET', url=url, **kwargs)
 
     if response is not None:
 
-        cl = int(response.headers.get('Content-Length', 0))
-        log.debug(f'downloading {url} to {path}')
+        try:
+            content_range = response.headers.get('Content-Range', '')
+            if response.status != 206 or not content_range.startswith(f'bytes {start}-'):
+                log.debug(f'range {start}-{end} not served for {url}, status {response.status}')
+                return -1
 
-        async with aiofile.async_open(path, 'wb') as f:
+            async with aiofile.AIOFile(path, 'r+b') as f:
+                size = await _write_response(response, f, start, chunk_size, buffer_size,
+                                             limiter=limiter, progress=progress)
 
-            size = 0
-            while True:
+            if size != end - start + 1:
+                log.debug(f'range {start}-{end} of {url} incomplete, {size} bytes')
+                return -1
 
-                data = await response.content.read(chunk_size)
-                if not data:
-                    log.debug(f'downloaded {size} bytes from {url}')
-                    break
-                await f.write(data)
-                size += len(data)
+            return size
 
-        return path, size, cl
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            log.error(f'download of range {start}-{end} of {url} failed: {e}')
 
-    return '', 0, 0
+        finally:
+            response.release()
+
+    return -1
+
+
+def _content_range_total(content_range: str) -> int:
+    """
+    Get the total length from a Content-Range header.
+
+    :param content_range: Content-Range header value, e.g `bytes */1234`
+    :return: the total length or -1 if unknown.
+    """
+    total = content_range.rpartition('/')[2]
+    if total.isdigit():
+        return int(total)
+    return -1
 
 
 async def websocket(url: str, **kwargs):
@@ -145,15 +443,63 @@ async def websocket(url: str, **kwargs):
     return await request(method='websocket', url=url, **kwargs)
 
 
-async def get(url: str, **kwargs):
+async def get(url: str, cache=None, **kwargs):
     """
     GET request.
 
+    If a cache is given, a cached response is revalidated with
+    a conditional request, and reused if the server responds with 304.
+    The body of a response from a cached request is already read.
+
+    :param url: url of the resource.
+    :param cache: ResponseCache object or None.
+    :return: aiohttp.ClientResponse, CachedResponse or None.
+    :rtype: aiohttp.ClientResponse | CachedResponse | None
+    """
+    if cache is None:
+        return await request(method='GET', url=url, **kwargs)
+
+    validators = cache.validators(url)
+    if len(validators) > 0:
+        headers = dict(default_headers(kwargs.get('headers'), kwargs.pop('rua', False)))
+        headers.update(validators)
+        kwargs['headers'] = headers
+
+    response = await request(method='GET', url=url, **kwargs)
+
+    if response is not None:
+
+        if response.status == 304:
+            response.release()
+            cached = cache.response(url)
+            if cached is not None:
+                log.debug(f'not modified, using cached response for {url}')
+                return cached
+
+            # the cached body is gone, request it again without validators
+            for key in validators:
+                kwargs['headers'].pop(key)
+            return await request(method='GET', url=url, **kwargs)
+
+        if response.status == 200:
+            try:
+                cache.store(url, await response.read(), response.headers)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                log.error(f'failed to read {url}: {e}')
+                return None
+
+    return response
+
+
+async def head(url: str, **kwargs):
+    """
+    HEAD request.
+
     :param url: url of the resource.
     :return: aiohttp.ClientResponse or None.
     :rtype: aiohttp.ClientResponse | None
     """
-    return await request(method='GET', url=url, **kwargs)
+    return await request(method='HEAD', url=url, **kwargs)
 
 
 async def post(url: str, **kwargs):
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+"""
+The MIT License (MIT)
+
+Copyright (c) 2024 Nortxort
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket limiting a rate, e.g bytes per second.
+
+    Tokens are taken after the fact, so an amount larger than the bucket
+    leaves it in debt, and the next consumer waits until the debt is paid.
+    This keeps the rate accurate whatever the size of the amounts.
+    Consumers wait in turn, in the order they arrived.
+    """
+    # max seconds to sleep before checking the rate again
+    MAX_SLEEP = 0.5
+
+    # seconds of tokens the bucket holds, without a burst size
+    BURST_SECONDS = 0.25
+
+    def __init__(self, rate: float = 0, burst: float = 0):
+        """
+        Initialize the TokenBucket class.
+
+        :param rate: tokens per second. 0 for no limit.
+        :param burst: size of the bucket. 0 for BURST_SECONDS of tokens.
+        """
+        self._rate = rate
+        self._burst = burst
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    @property
+    def rate(self) -> float:
+        """ tokens per second, 0 for no limit. """
+        return self._rate
+
+    @rate.setter
+    def rate(self, value: float):
+        self._refill()
+        self._rate = value
+        self._tokens = min(self._tokens, self.burst)
+
+    @property
+    def burst(self) -> float:
+        """ size of the bucket. """
+        return self._burst or self._rate * self.BURST_SECONDS
+
+    def _refill(self):
+        now = time.monotonic()
+        if self._rate > 0:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    async def consume(self, amount: int):
+        """
+        Take tokens from the bucket, and wait while the bucket is in debt.
+
+        :param amount: the amount of tokens to take.
+        """
+        if self._rate <= 0:
+            return
+
+        async with self._lock:
+            self._refill()
+            self._tokens -= amount
+
+            # the rate can change while waiting
+            while self._tokens < 0 and self._rate > 0:
+                await asyncio.sleep(min(-self._tokens / self._rate, self.MAX_SLEEP))
+                self._refill()
+
+
+class RateLimiter:
+    """
+    Bandwidth limit in bytes per second, for all hosts and per host.
+
+    The limits can be changed while downloading.
+    """
+    def __init__(self, rate: float = 0, host_rate: float = 0, host_rates: dict = None):
+        """
+        Initialize the RateLimiter class.
+
+        :param rate: max bytes per second of all downloads. 0 for no limit.
+        :param host_rate: max bytes per second per host. 0 for no limit.
+        :param host_rates: max bytes per second of specific hosts,
+        instead of host_rate.
+        """
+        self._bucket = TokenBucket(rate)
+        self._host_rate = host_rate
+        self._host_rates = {} if host_rates is None else dict(host_rates)
+        self._hosts = {}
+
+    @property
+    def rate(self) -> float:
+        """ max bytes per second of all downloads, 0 for no limit. """
+        return self._bucket.rate
+
+    @rate.setter
+    def rate(self, value: float):
+        self._bucket.rate = value
+
+    @property
+    def host_rate(self) -> float:
+        """ max bytes per second per host, 0 for no limit. """
+        return self._host_rate
+
+    @host_rate.setter
+    def host_rate(self, value: float):
+        self._host_rate = value
+        for host, bucket in self._hosts.items():
+            bucket.rate = self._host_rates.get(host, value)
+
+    def set_host_rate(self, host: str, rate: float):
+        """
+        Set the max bytes per second of a specific host.
+
+        :param host: the host name.
+        :param rate: max bytes per second. 0 for no limit.
+        """
+        self._host_rates[host] = rate
+        if host in self._hosts:
+            self._hosts[host].rate = rate
+
+    async def consume(self, host: str, nbytes: int):
+        """
+        Account for received bytes, and wait while over a limit.
+
+        :param host: the host the bytes were received from.
+        :param nbytes: the amount of bytes received.
+        """
+        bucket = self._hosts.get(host)
+        if bucket is None:
+            bucket = TokenBucket(self._host_rates.get(host, self._host_rate))
+            self._hosts[host] = bucket
+
+        await bucket.consume(nbytes)
+        await self._bucket.consume(nbytes)
@@ -32,13 +32,42 @@ import aiohttp
 
 log = logging.getLogger(__name__)
 
+# connection pool profile for html pages, many small requests
+# over a few kept alive connections.
+PAGE_PROFILE = {
+    'limit': 16,
+    'limit_per_host': 8,
+    'ttl_dns_cache': 300,
+    'keepalive_timeout': 30,
+    'happy_eyeballs_delay': 0.25,
+    'timeout': aiohttp.ClientTimeout(total=60, sock_connect=10, sock_read=20),
+    'read_bufsize': 2 ** 16
+}
+
+# connection pool profile for large file downloads. There is no total
+# timeout, since a large file can take longer than any sensible total.
+DOWNLOAD_PROFILE = {
+    'limit': 64,
+    'limit_per_host': 32,
+    'ttl_dns_cache': 300,
+    'keepalive_timeout': 60,
+    'happy_eyeballs_delay': 0.25,
+    'timeout': aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=60),
+    'read_bufsize': 2 ** 20
+}
+
 
 class Session:
     """
     Session class maintaining cookies across requests.
+
+    Besides the default session, named pools can be created, each with
+    their own connector and limits, sharing the cookies of the session.
     """
     session = None
     connector = None
+    pools = {}
+    _cookie_jar = None
     _cookie_to_delete = None
 
     @classmethod
@@ -54,25 +83,87 @@ class Session:
             # try, except?
             cls.connector = connector
 
-        cls.session = aiohttp.ClientSession(cookies=cookies, connector=cls.connector)
+        cls.session = aiohttp.ClientSession(cookies=cookies, connector=cls.connector,
+                                            cookie_jar=cls._shared_cookie_jar())
         log.debug(f'creating session: `{cls.session}`, connector: `{cls.connector}`')
 
         return cls.session
 
+    @classmethod
+    def create_pool(cls, name: str, profile: dict = None, **kwargs):
+        """
+        Create a named session with its own pooled connector.
+
+        Requests made with `pool=name` use this session.
+
+        :param name: name of the pool.
+        :param profile: connector and session options, e.g PAGE_PROFILE.
+        :param kwargs: options overriding the profile. timeout and
+        read_bufsize are session options, the rest are aiohttp.TCPConnector options.
+        :return: aiohttp.ClientSession object.
+        """
+        options = dict(profile or {})
+        options.update(kwargs)
+
+        session_options = {key: options.pop(key) for key in ('timeout', 'read_bufsize')
+                           if key in options}
+
+        connector = aiohttp.TCPConnector(**options)
+        pool = aiohttp.ClientSession(connector=connector, cookie_jar=cls._shared_cookie_jar(),
+                                     **session_options)
+        log.debug(f'creating pool `{name}`: `{pool}`, options: {options}')
+
+        cls.pools[name] = pool
+        return pool
+
+    @classmethod
+    def get(cls, pool: str = None):
+        """
+        Get a session.
+
+        :param pool: name of a pool, or None for the default session.
+        :return: the pool if it exists, else the default session.
+        """
+        if pool is not None and pool in cls.pools:
+            return cls.pools[pool]
+
+        if cls.session is None:
+            return cls.create()
+
+        return cls.session
+
+    @classmethod
+    def _shared_cookie_jar(cls):
+        if cls._cookie_jar is None:
+            cls._cookie_jar = aiohttp.CookieJar()
+        return cls._cookie_jar
+
     @classmethod
     async def close(cls, delay: float = 0.250) -> None:
         """
-        Close the session object.
+        Close the session object, and the pools.
 
         :param delay: A small delay to let connections close gracefully.
         :type delay: float
         """
+        closed = len(cls.pools) > 0
+
+        for name, pool in cls.pools.items():
+            log.debug(f'closing pool `{name}`')
+            await pool.close()
+        cls.pools = {}
+
         if cls.session is not None:
             log.debug(f'closing session, type: `{type(cls.session)}`')
             await cls.session.close()
+            cls.session = None
+            closed = True
+
+        if closed:
             # wait for connections to close
             await asyncio.sleep(delay)
-            cls.session = None
+
+        cls._cookie_jar = None
 
     @classmethod
     async def close_connector(cls):